@@ -0,0 +1,105 @@
+"""Helpers shared by the benchmarks: synthetic inputs, memory measurement and fresh processes"""
+import io
+import multiprocessing
+import os
+import queue
+import sys
+import traceback
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from memory_usage import current_rss_kb, peak_rss_kb, reset_peak_rss  # noqa: E402,F401
+
+CHECKPOINTS = {
+    "U2NET": "u2net.pth",
+    "U2NETP": "u2netp.pth",
+}
+
+
+def image_size(megapixels, aspect=4 / 3):
+    """``(width, height)`` of an image of ``megapixels`` with the given width:height ratio"""
+    width = int((megapixels * 1e6 * aspect) ** 0.5)
+    return width, int(megapixels * 1e6 / width)
+
+
+def synthetic_image(megapixels, seed=0, grain=16, aspect=4 / 3):
+    """A deterministic photo stand-in: smooth gradients with seeded grain
+
+    The gradient decodes like a photo without costing a random fill; the
+    grain (up to ``grain`` levels, 0 for none) keeps PNG and WebP from
+    compressing the input to nothing.
+    """
+    import numpy as np
+    from PIL import Image
+
+    width, height = image_size(megapixels, aspect)
+    top = 255 - grain
+    x = np.linspace(0, top, width, dtype=np.float32)
+    y = np.linspace(0, top, height, dtype=np.float32)[:, None]
+    rgb = np.empty((height, width, 3), dtype=np.uint8)
+    rgb[..., 0] = x
+    rgb[..., 1] = y
+    rgb[..., 2] = (x + y) / 2
+    if grain:
+        rgb += np.random.default_rng(seed).integers(0, grain, size=(height, width), dtype=np.uint8)[..., None]
+    return Image.fromarray(rgb, 'RGB')
+
+
+def encode_input(image, fmt):
+    """Encode ``image`` as a png, jpg or webp upload"""
+    buffer = io.BytesIO()
+    if fmt == "png":
+        image.save(buffer, format="PNG")
+    else:
+        image.save(buffer, format={"jpg": "JPEG", "webp": "WEBP"}[fmt], quality=90)
+    return buffer.getvalue()
+
+
+def model_checkpoint(arch, models_dir, scratch_dir):
+    """The installed checkpoint for ``arch``, or a randomly initialised one saved to ``scratch_dir``
+
+    Returns the path and "checkpoint" or "random"; timing and memory do
+    not depend on the weights.
+    """
+    import torch
+    from model_registry import ARCHITECTURES
+
+    checkpoint = os.path.join(models_dir, CHECKPOINTS[arch])
+    if os.path.exists(checkpoint):
+        return checkpoint, "checkpoint"
+    torch.manual_seed(0)
+    path = os.path.join(scratch_dir, CHECKPOINTS[arch])
+    torch.save(ARCHITECTURES[arch](3, 1).state_dict(), path)
+    return path, "random"
+
+
+def _put_result(target, args, results):
+    try:
+        results.put((True, target(*args)))
+    except BaseException:
+        results.put((False, traceback.format_exc()))
+
+
+def run_in_fresh_process(target, *args):
+    """Run ``target(*args)`` in a newly spawned interpreter and return what it returns
+
+    Each case starts from an empty heap with only what it imports itself,
+    so peak RSS and allocator state do not carry over from earlier cases.
+    ``target`` must be a module-level function returning a picklable
+    result; an exception or crash in the child is raised here.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    proc = ctx.Process(target=_put_result, args=(target, args, results))
+    proc.start()
+    while True:
+        try:
+            ok, result = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if not proc.is_alive():
+                raise RuntimeError(f"{target.__name__} died with exit code {proc.exitcode}")
+    proc.join()
+    if not ok:
+        raise RuntimeError(f"{target.__name__} failed:\n{result}")
+    return result
@@ -0,0 +1,109 @@
+"""Measure draft-mode decoding of large JPEGs rendered at a smaller resolution
+
+Usage:
+    python benchmarks/bench_decode.py [--sizes 12 50] [--resolution hd] [--runs 3]
+
+Encodes a synthetic JPEG of each megapixel count, then renders it at
+``--resolution`` two ways: the previous full-size path (decode, upsample
+the mask and composite at the original size, then resize) and the
+current one (decode_for_output, resize the pixels, composite at the
+output size). The forward pass is replaced by a fixed 320x320 prediction.
+Each case runs in a fresh process and reports decode and total time and
+the peak RSS added on top of the encoded input.
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from _common import current_rss_kb, encode_input, peak_rss_kb, reset_peak_rss, run_in_fresh_process, synthetic_image
+
+
+def full_size_pipeline(data, resolution, mask_small):
+    from PIL import Image
+
+    from background_removal import target_size
+    from image_ops import apply_alpha, preprocess, upsample_mask
+
+    start = time.perf_counter()
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    decoded = time.perf_counter()
+
+    preprocess(image)
+    result = apply_alpha(image, upsample_mask(mask_small, image.size))
+    result = result.resize(target_size(resolution, image.size), Image.LANCZOS)
+    return decoded - start
+
+
+def draft_pipeline(data, resolution, mask_small):
+    from PIL import Image
+
+    from background_removal import decode_for_output
+    from image_ops import apply_alpha, preprocess, upsample_mask
+
+    start = time.perf_counter()
+    image, output_size = decode_for_output(data, resolution)
+    decoded = time.perf_counter()
+
+    preprocess(image)
+    mask = upsample_mask(mask_small, output_size)
+    if image.size != output_size:
+        image = image.resize(output_size, Image.LANCZOS)
+    apply_alpha(image, mask)
+    return decoded - start
+
+
+PIPELINES = {
+    "full-size": full_size_pipeline,
+    "draft": draft_pipeline,
+}
+
+
+def _measure(name, data, resolution, runs):
+    import numpy as np
+    # Import everything the pipelines use up front so it is not timed or counted
+    import background_removal  # noqa: F401
+    import image_ops  # noqa: F401
+
+    mask_small = (np.random.default_rng(0).random((320, 320)) * 255).astype(np.uint8)
+    pipeline = PIPELINES[name]
+
+    reset_peak_rss()
+    rss_before = current_rss_kb()
+    decode_times, total_times = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        decode_times.append(pipeline(data, resolution, mask_small))
+        total_times.append(time.perf_counter() - start)
+    peak_kb = peak_rss_kb()
+
+    return {
+        "decode_ms": statistics.median(decode_times) * 1000,
+        "total_ms": statistics.median(total_times) * 1000,
+        "peak_extra_mb": max(0, peak_kb - rss_before) / 1024,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[12, 50], help="Megapixels")
+    parser.add_argument("--resolution", default="hd", choices=["hd", "fullhd", "4k"])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'MP':>5} {'pipeline':>10} {'decode ms':>10} {'total ms':>9} {'peak +MB':>9}")
+    for megapixels in args.sizes:
+        data = encode_input(synthetic_image(megapixels, grain=0), "jpg")
+        for name in PIPELINES:
+            result = run_in_fresh_process(_measure, name, data, args.resolution, args.runs)
+            print(f"{megapixels:>5g} {name:>10} {result['decode_ms']:>10.1f} "
+                  f"{result['total_ms']:>9.1f} {result['peak_extra_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Compare the full U2NET forward pass with the inference-only d0/d1 paths
+
+Usage:
+    python benchmarks/bench_forward.py [--arch U2NET] [--runs 10] [--checkpoint src/models/u2net.pth]
+                                       [--images DIR]
+
+Each mode runs in a fresh process so peak RSS is measured independently.
+Randomly initialised weights are used when no checkpoint is given; timing
+and memory do not depend on the weights.
+
+The d1 path is faster but returns a different, coarser map than the fused
+d0 the service serves by default, so the masks of both are also compared
+on the images in ``--images`` (synthetic gradients by default): mean and
+worst absolute difference of the normalized masks and IoU at 0.5. Only a
+trained ``--checkpoint`` makes that comparison meaningful.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from _common import current_rss_kb, peak_rss_kb, reset_peak_rss, run_in_fresh_process, synthetic_image
+
+MODES = [None, "d0", "d1"]
+
+
+def _measure(arch, mode, checkpoint, runs, size):
+    import torch
+    from model_registry import ARCHITECTURES, build_network
+
+    if checkpoint:
+        net = build_network(checkpoint, arch=arch, device="cpu", output=mode)
+    else:
+        net = ARCHITECTURES[arch](3, 1).set_inference_output(mode).eval()
+
+    x = torch.rand(1, 3, size, size)
+    # Activations are allocated on the first pass, so measure from before it
+    reset_peak_rss()
+    rss_before = current_rss_kb()
+    with torch.no_grad():
+        net(x)
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            net(x)
+            times.append(time.perf_counter() - start)
+    peak_kb = peak_rss_kb()
+
+    return {
+        "median_ms": statistics.median(times) * 1000,
+        "peak_extra_mb": max(0, peak_kb - rss_before) / 1024,
+    }
+
+
+def check_outputs_match(arch, size):
+    """The d0/d1 paths must return exactly the maps the full forward returns"""
+    import torch
+    from model_registry import ARCHITECTURES
+
+    net = ARCHITECTURES[arch](3, 1).eval()
+    x = torch.rand(1, 3, size, size)
+    with torch.no_grad():
+        full = net(x)
+        d1 = net.set_inference_output("d1")(x)
+        d0 = net.set_inference_output("d0")(x)
+    return max(float((full[1] - d1).abs().max()), float((full[0] - d0).abs().max()))
+
+
+def compare_d1_to_d0(arch, checkpoint, size, image_dir=None, count=8):
+    """How far the d1 fast path's masks are from the fused d0 masks, over sample images"""
+    from pathlib import Path
+
+    import numpy as np
+    import torch
+    from PIL import Image
+
+    from background_removal import IMAGE_EXTENSIONS
+    from image_ops import normalize_mask, preprocess
+    from model_registry import ARCHITECTURES, build_network
+
+    if checkpoint:
+        net = build_network(checkpoint, arch=arch, device="cpu", output=None)
+    else:
+        torch.manual_seed(0)
+        net = ARCHITECTURES[arch](3, 1).eval()
+    if image_dir:
+        paths = sorted(p for p in Path(image_dir).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+        images = [Image.open(path) for path in paths[:count]]
+    else:
+        images = [synthetic_image(0.3, seed=seed) for seed in range(count)]
+
+    mean_diff, max_diff, ious = [], [], []
+    for image in images:
+        with torch.no_grad():
+            d0, d1, *_ = net(preprocess(image, size=size))
+        d0 = normalize_mask(d0[0, 0].numpy()).astype(np.float32) / 255
+        d1 = normalize_mask(d1[0, 0].numpy()).astype(np.float32) / 255
+        diff = np.abs(d0 - d1)
+        mean_diff.append(float(diff.mean()))
+        max_diff.append(float(diff.max()))
+        union = np.logical_or(d0 > 0.5, d1 > 0.5).sum()
+        ious.append(float(np.logical_and(d0 > 0.5, d1 > 0.5).sum() / union) if union else 1.0)
+    return {
+        "images": len(images),
+        "mean_abs_diff": statistics.mean(mean_diff),
+        "max_abs_diff": max(max_diff),
+        "mean_iou": statistics.mean(ious),
+        "min_iou": min(ious),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--arch", default="U2NET", choices=["U2NET", "U2NETP"])
+    parser.add_argument("--checkpoint", default=None)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--size", type=int, default=320)
+    parser.add_argument("--images", default=None, help="Images for the d0/d1 mask comparison (default: synthetic)")
+    args = parser.parse_args(argv)
+
+    print(f"{args.arch} at {args.size}x{args.size}, {args.runs} runs per mode")
+    print(f"max difference between full and inference-only outputs: {check_outputs_match(args.arch, args.size):.2e}")
+    gap = compare_d1_to_d0(args.arch, args.checkpoint, args.size, args.images)
+    print(f"d1 vs served d0 masks over {gap['images']} images ({args.checkpoint or 'random weights'}): "
+          f"mean |diff| {gap['mean_abs_diff']:.4f}, max {gap['max_abs_diff']:.4f}, "
+          f"IoU mean {gap['mean_iou']:.3f}, min {gap['min_iou']:.3f}")
+
+    baseline = None
+    for mode in MODES:
+        result = run_in_fresh_process(_measure, args.arch, mode, args.checkpoint, args.runs, args.size)
+        label = mode or "all seven"
+        if baseline is None:
+            baseline = result
+            saved = ""
+        else:
+            saved_ms = baseline["median_ms"] - result["median_ms"]
+            saved = f"  (saves {saved_ms:.1f} ms, {baseline['peak_extra_mb'] - result['peak_extra_mb']:.1f} MB)"
+        print(f"{label:>9}: {result['median_ms']:8.1f} ms/image, peak +{result['peak_extra_mb']:.1f} MB{saved}")
+
+
+if __name__ == "__main__":
+    main()
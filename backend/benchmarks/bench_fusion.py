@@ -0,0 +1,79 @@
+"""Check that BatchNorm folding is numerically equivalent and measure its speedup
+
+Usage:
+    python benchmarks/bench_fusion.py [--arch U2NET] [--runs 10] [--checkpoint src/models/u2net.pth]
+
+Without a checkpoint the BatchNorm running statistics and affine
+parameters are randomised, so the fold is exercised with non-trivial
+values. Exits non-zero when the fused d0 map differs from the unfused
+one by more than ``--tolerance``.
+"""
+import argparse
+import copy
+import os
+import statistics
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from model_registry import ARCHITECTURES, build_network
+from u2net_model import fuse_rebnconv
+
+
+def _randomize_batchnorm(net, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    for module in net.modules():
+        if isinstance(module, torch.nn.BatchNorm2d):
+            n = module.num_features
+            module.running_mean.copy_(torch.randn(n, generator=generator) * 0.1)
+            module.running_var.copy_(torch.rand(n, generator=generator) + 0.5)
+            module.weight.data.copy_(torch.rand(n, generator=generator) + 0.5)
+            module.bias.data.copy_(torch.randn(n, generator=generator) * 0.1)
+
+
+def _median_ms(net, x, runs):
+    times = []
+    with torch.no_grad():
+        net(x)
+        for _ in range(runs):
+            start = time.perf_counter()
+            net(x)
+            times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--arch", default="U2NET", choices=sorted(ARCHITECTURES))
+    parser.add_argument("--checkpoint", default=None)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--tolerance", type=float, default=1e-4)
+    args = parser.parse_args(argv)
+
+    if args.checkpoint:
+        reference = build_network(args.checkpoint, arch=args.arch, device="cpu", output="d0", fuse=False)
+    else:
+        reference = ARCHITECTURES[args.arch](3, 1).set_inference_output("d0").eval()
+        _randomize_batchnorm(reference)
+    fused = fuse_rebnconv(copy.deepcopy(reference))
+
+    x = torch.rand(2, 3, 320, 320, generator=torch.Generator().manual_seed(1))
+    with torch.no_grad():
+        max_diff = float((reference(x) - fused(x)).abs().max())
+
+    batchnorms = sum(isinstance(m, torch.nn.BatchNorm2d) for m in reference.modules())
+    unfused_ms = _median_ms(reference, x[:1], args.runs)
+    fused_ms = _median_ms(fused, x[:1], args.runs)
+
+    ok = max_diff <= args.tolerance
+    print(f"{args.arch}: folded {batchnorms} BatchNorm layers")
+    print(f"max |unfused - fused| on d0: {max_diff:.2e} ({'OK' if ok else 'MISMATCH'}, tolerance {args.tolerance:.0e})")
+    print(f"unfused {unfused_ms:.1f} ms/image, fused {fused_ms:.1f} ms/image ({unfused_ms / fused_ms:.2f}x)")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Micro-benchmark of the pre/post-processing around the forward pass
+
+Usage:
+    python benchmarks/bench_image_ops.py [--sizes 1 12 48] [--runs 3]
+
+Compares the original NumPy float64 path of remove_background with
+image_ops (preprocess, normalize_mask, upsample_mask, apply_alpha) on
+synthetic images of the given megapixel counts. The forward pass is
+replaced by a fixed 320x320 prediction so only the image work is timed.
+Each case runs in a fresh process and reports ms per megapixel and the
+peak RSS added on top of the decoded input.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from _common import current_rss_kb, peak_rss_kb, reset_peak_rss, run_in_fresh_process, synthetic_image
+
+
+def legacy_pipeline(image, pred):
+    import numpy as np
+    import torch
+    from PIL import Image
+
+    small = image.convert('RGB').resize((320, 320))
+    img_np = np.array(small).astype(np.float32) / 255.0
+    img_np = img_np.transpose((2, 0, 1))
+    torch.from_numpy(img_np).unsqueeze(0)
+
+    pred = (pred - pred.min()) / (pred.max() - pred.min())
+    mask = Image.fromarray((pred * 255).astype(np.uint8)).resize(image.size, Image.LANCZOS)
+
+    rgba = image.convert('RGBA')
+    mask_np = np.array(mask) / 255.0
+    img_np = np.array(rgba)
+    img_np[..., 3] = (mask_np * 255).astype(np.uint8)
+    return Image.fromarray(img_np, 'RGBA')
+
+
+def image_ops_pipeline(image, pred):
+    from image_ops import apply_alpha, normalize_mask, preprocess, upsample_mask
+
+    preprocess(image)
+    mask = upsample_mask(normalize_mask(pred.copy()), image.size)
+    return apply_alpha(image, mask)
+
+
+PIPELINES = {
+    "legacy": legacy_pipeline,
+    "image_ops": image_ops_pipeline,
+}
+
+
+def _measure(name, megapixels, runs):
+    import numpy as np
+    # Import everything the pipelines use up front so it is not timed or counted
+    import image_ops  # noqa: F401
+    import torch  # noqa: F401
+
+    image = synthetic_image(megapixels, grain=0)
+    pred = np.random.default_rng(0).random((320, 320), dtype=np.float32)
+    pipeline = PIPELINES[name]
+
+    reset_peak_rss()
+    rss_before = current_rss_kb()
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        pipeline(image, pred)
+        times.append(time.perf_counter() - start)
+    peak_kb = peak_rss_kb()
+
+    actual_mp = image.size[0] * image.size[1] / 1e6
+    return {
+        "ms_per_mp": statistics.median(times) * 1000 / actual_mp,
+        "peak_extra_mb": max(0, peak_kb - rss_before) / 1024,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 12, 48], help="Megapixels")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'MP':>5} {'pipeline':>10} {'ms/MP':>8} {'peak +MB':>9}")
+    for megapixels in args.sizes:
+        for name in PIPELINES:
+            result = run_in_fresh_process(_measure, name, megapixels, args.runs)
+            print(f"{megapixels:>5g} {name:>10} {result['ms_per_mp']:>8.1f} {result['peak_extra_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
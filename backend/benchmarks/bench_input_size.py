@@ -0,0 +1,159 @@
+"""Latency against mask quality for each inference size, letterboxed and stretched
+
+Usage:
+    python benchmarks/bench_input_size.py [--checkpoint src/models/u2net.pth] [--arch U2NET]
+                                          [--sizes 192 256 320 448] [--runs 5]
+                                          [--images DIR --masks DIR] [--output results.json]
+
+Every image is run through the network at each size, both letterboxed into
+the square (aspect ratio kept, margins padded with edge pixels) and
+stretched to it, and the mask is scaled back to the image size as served.
+Quality is reported as the IoU of the thresholded mask with the ground
+truth and with the 320 stretched mask the server produced before inputs
+were bucketed, plus the mean absolute difference of the soft mask from
+that reference. Ground truth comes from ``--masks`` (grayscale masks named
+like the images in ``--images``) or, by default, from synthetic scenes at
+several aspect ratios with a known foreground. Without ``--checkpoint``
+the weights are random, so only latency and agreement with the reference
+are meaningful; pass a trained checkpoint to judge quality.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import config
+from _common import synthetic_image
+from background_removal import IMAGE_EXTENSIONS
+from image_ops import INPUT_SIZE, fit_box, normalize_mask, preprocess, upsample_mask
+from model_registry import ARCHITECTURES, build_network
+
+# Width:height of the synthetic scenes, from panorama to portrait
+ASPECTS = (1.0, 4 / 3, 16 / 9, 3.0, 3 / 4, 9 / 16)
+
+
+def synthetic_scene(aspect, megapixels=0.75, seed=0):
+    """A grainy gradient background with an elliptical subject, and its ground-truth mask"""
+    rng = np.random.default_rng(seed)
+    background = np.asarray(synthetic_image(megapixels, seed=seed, aspect=aspect), dtype=np.float32)
+    height, width = background.shape[:2]
+
+    mask = Image.new("L", (width, height), 0)
+    box = (width * 0.3, height * 0.15, width * 0.7, height * 0.95)
+    ImageDraw.Draw(mask).ellipse(box, fill=255)
+    truth = np.asarray(mask) > 127
+    subject = np.array([200, 70, 50], dtype=np.float32) + rng.normal(0, 20, background.shape)
+    pixels = np.where(truth[..., None], subject, background)
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), "RGB")
+    return f"synthetic_{width}x{height}", image, truth
+
+
+def load_pairs(image_dir, mask_dir):
+    pairs = []
+    for path in sorted(Path(image_dir).iterdir()):
+        if path.suffix.lower() not in IMAGE_EXTENSIONS:
+            continue
+        masks = [m for m in Path(mask_dir).glob(path.stem + ".*") if m.suffix.lower() in IMAGE_EXTENSIONS]
+        if not masks:
+            print(f"Skipping {path.name}: no mask in {mask_dir}")
+            continue
+        image = Image.open(path).convert("RGB")
+        truth = np.asarray(Image.open(masks[0]).convert("L").resize(image.size)) > 127
+        pairs.append((path.name, image, truth))
+    return pairs
+
+
+def predict(net, image, size, letterbox, runs):
+    """Median forward-pass time and the soft mask at the image size"""
+    box = fit_box(image.size, size) if letterbox else None
+    x = preprocess(image, size=size, box=box).clone()
+    times = []
+    with torch.no_grad():
+        for _ in range(runs):
+            start = time.perf_counter()
+            pred = net(x)
+            times.append(time.perf_counter() - start)
+    pred = pred[0, 0].numpy()
+    if box is not None:
+        left, top, right, bottom = box
+        pred = pred[top:bottom, left:right]
+    mask = np.asarray(upsample_mask(normalize_mask(pred), image.size))
+    return statistics.median(times), mask
+
+
+def iou(a, b):
+    union = np.logical_or(a, b).sum()
+    return float(np.logical_and(a, b).sum() / union) if union else 1.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--checkpoint", default=None)
+    parser.add_argument("--arch", default="U2NET", choices=sorted(ARCHITECTURES))
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(config.INFERENCE_SIZES))
+    parser.add_argument("--runs", type=int, default=5, help="Timed forward passes per image and case")
+    parser.add_argument("--images", default=None, help="Directory of images (default: synthetic scenes)")
+    parser.add_argument("--masks", default=None, help="Directory of ground-truth masks named like the images")
+    parser.add_argument("--output", default=None, help="Write the results as JSON")
+    args = parser.parse_args(argv)
+    if bool(args.images) != bool(args.masks):
+        parser.error("--images and --masks go together")
+
+    if args.checkpoint:
+        net = build_network(args.checkpoint, arch=args.arch, device="cpu", output="d0")
+    else:
+        torch.manual_seed(0)
+        net = ARCHITECTURES[args.arch](3, 1).set_inference_output("d0").eval()
+    if args.images:
+        pairs = load_pairs(args.images, args.masks)
+    else:
+        pairs = [synthetic_scene(aspect, seed=i) for i, aspect in enumerate(ASPECTS)]
+    if not pairs:
+        parser.error("No images with masks found")
+
+    references = {name: predict(net, image, INPUT_SIZE, False, 1)[1] for name, image, _ in pairs}
+
+    results = []
+    print(f"{args.arch} on {len(pairs)} images ({args.checkpoint or 'random weights'})")
+    print(f"{'size':>5} {'mode':>9} {'ms/image':>9} {'IoU truth':>10} {'IoU ref':>8} {'MAE ref':>8}")
+    for size in sorted(args.sizes):
+        for letterbox in (True, False):
+            seconds, truth_iou, ref_iou, ref_mae = [], [], [], []
+            for name, image, truth in pairs:
+                elapsed, mask = predict(net, image, size, letterbox, args.runs)
+                reference = references[name]
+                seconds.append(elapsed)
+                truth_iou.append(iou(mask > 127, truth))
+                ref_iou.append(iou(mask > 127, reference > 127))
+                ref_mae.append(float(np.abs(mask.astype(np.float32) - reference).mean() / 255))
+            result = {
+                "size": size,
+                "mode": "letterbox" if letterbox else "stretch",
+                "ms_per_image": round(statistics.median(seconds) * 1000, 1),
+                "iou_truth": round(statistics.mean(truth_iou), 4),
+                "iou_reference": round(statistics.mean(ref_iou), 4),
+                "mae_reference": round(statistics.mean(ref_mae), 4),
+            }
+            results.append(result)
+            print(f"{size:>5} {result['mode']:>9} {result['ms_per_image']:>9.1f} {result['iou_truth']:>10.4f} "
+                  f"{result['iou_reference']:>8.4f} {result['mae_reference']:>8.4f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"arch": args.arch, "checkpoint": args.checkpoint, "images": [p[0] for p in pairs],
+                       "results": results}, f, indent=2)
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
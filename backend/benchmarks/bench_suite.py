@@ -0,0 +1,187 @@
+"""Offline regression benchmark of the full removal pipeline for every model variant
+
+Usage:
+    python benchmarks/bench_suite.py [--archs U2NET U2NETP] [--sizes 0.3 2 12] [--formats jpg png webp]
+                                     [--runs 5] [--output results.json]
+                                     [--baseline baseline.json] [--threshold 0.15]
+
+Synthetic images of each megapixel count are generated locally and
+encoded in each input format, then run through ``render_output`` at their
+original size with the result caches disabled. Every architecture runs in
+a fresh process on the checkpoint in ``--models-dir`` when there is one,
+or on randomly initialised weights otherwise (timing and memory do not
+depend on the weights).
+
+For each case the suite records throughput, p50/p95 latency of the whole
+pipeline and of each StageTimer stage, and the peak RSS while the case
+ran, and writes them to ``--output`` together with the library versions.
+Save a run as the baseline on a quiet machine, then compare later runs
+(e.g. after a Pillow, NumPy or torch upgrade) with ``--baseline``: the
+exit status is 1 when any case is slower, or uses more memory, than the
+baseline by more than ``--threshold``.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from _common import (
+    CHECKPOINTS, encode_input, model_checkpoint, peak_rss_kb, reset_peak_rss, run_in_fresh_process, synthetic_image,
+)
+
+# Pipeline metrics gated against the baseline, and whether higher is worse
+GATED = {
+    "p50_ms": True,
+    "p95_ms": True,
+    "images_per_sec": False,
+    "peak_rss_mb": True,
+}
+
+
+def percentile(values, q):
+    """Linearly interpolated ``q``-th percentile (0-100) of ``values``"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def _summarize(totals, stages, megapixels, peak_kb):
+    return {
+        "runs": len(totals),
+        "p50_ms": percentile(totals, 50) * 1000,
+        "p95_ms": percentile(totals, 95) * 1000,
+        "images_per_sec": len(totals) / sum(totals),
+        "megapixels_per_sec": len(totals) * megapixels / sum(totals),
+        "peak_rss_mb": peak_kb / 1024,
+        "stages": {
+            stage: {"p50_ms": percentile(times, 50) * 1000, "p95_ms": percentile(times, 95) * 1000}
+            for stage, times in stages.items()
+        },
+    }
+
+
+def _measure(arch, sizes, formats, runs, models_dir, threads):
+    # Every run must pay for inference and encoding, not hit a cache
+    os.environ["BG_MASK_CACHE_MB"] = "0"
+    os.environ["BG_MASK_CACHE_DISK_DIR"] = ""
+    os.environ["BG_RENDER_CACHE_MB"] = "0"
+    import torch
+    from background_removal import render_output
+    from model_registry import load_model
+    from timing import StageTimer
+
+    if threads:
+        torch.set_num_threads(threads)
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        model_path, weights = model_checkpoint(arch, models_dir, scratch_dir)
+        load_model(model_path, arch=arch, device="cpu")
+
+        cases = {}
+        for megapixels in sizes:
+            image = synthetic_image(megapixels)
+            actual_mp = image.size[0] * image.size[1] / 1e6
+            for fmt in formats:
+                data = encode_input(image, fmt)
+                # Warm-up run, so lazily allocated buffers are not timed
+                render_output(data, "original", model_path, None, arch=arch)
+
+                reset_peak_rss()
+                totals, stages = [], {}
+                for _ in range(runs):
+                    timer = StageTimer()
+                    start = time.perf_counter()
+                    render_output(data, "original", model_path, None, timer=timer, arch=arch)
+                    totals.append(time.perf_counter() - start)
+                    for stage, seconds in timer.timings.items():
+                        stages.setdefault(stage, []).append(seconds)
+                cases[f"{megapixels:g}mp_{fmt}"] = _summarize(totals, stages, actual_mp, peak_rss_kb())
+    return {"weights": weights, "threads": torch.get_num_threads(), "cases": cases}
+
+
+def environment():
+    import numpy as np
+    import PIL
+    import torch
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch.__version__,
+        "numpy": np.__version__,
+        "pillow": PIL.__version__,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return ``(arch, case, metric, baseline, current, change)`` for every gated metric past ``threshold``"""
+    regressions = []
+    for arch, arch_result in results["archs"].items():
+        baseline_cases = baseline.get("archs", {}).get(arch, {}).get("cases", {})
+        for case, metrics in arch_result["cases"].items():
+            reference = baseline_cases.get(case)
+            if reference is None:
+                continue
+            for metric, higher_is_worse in GATED.items():
+                before, after = reference[metric], metrics[metric]
+                if not before:
+                    continue
+                change = (after - before) / before
+                if (change if higher_is_worse else -change) > threshold:
+                    regressions.append((arch, case, metric, before, after, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--archs", nargs="+", default=list(CHECKPOINTS), choices=sorted(CHECKPOINTS))
+    parser.add_argument("--sizes", type=float, nargs="+", default=[0.3, 2, 12], help="Megapixels")
+    parser.add_argument("--formats", nargs="+", default=["jpg", "png", "webp"], choices=["jpg", "png", "webp"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 keeps the default)")
+    parser.add_argument("--models-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "models"))
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", default=None, help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed fractional regression")
+    args = parser.parse_args(argv)
+
+    results = {"created_at": time.time(), "environment": environment(), "runs": args.runs, "archs": {}}
+    print(f"{'arch':>6} {'case':>10} {'p50 ms':>9} {'p95 ms':>9} {'img/s':>7} {'MP/s':>7} {'peak MB':>8}  weights")
+    for arch in args.archs:
+        arch_result = run_in_fresh_process(_measure, arch, args.sizes, args.formats, args.runs, args.models_dir, args.threads)
+        results["archs"][arch] = arch_result
+        for case, metrics in arch_result["cases"].items():
+            print(f"{arch:>6} {case:>10} {metrics['p50_ms']:>9.1f} {metrics['p95_ms']:>9.1f} "
+                  f"{metrics['images_per_sec']:>7.2f} {metrics['megapixels_per_sec']:>7.1f} "
+                  f"{metrics['peak_rss_mb']:>8.0f}  {arch_result['weights']}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"Wrote {args.output}")
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    changed = {name: (baseline["environment"].get(name), version)
+               for name, version in results["environment"].items()
+               if baseline["environment"].get(name) != version}
+    for name, (before, after) in sorted(changed.items()):
+        print(f"environment: {name} {before} -> {after}")
+
+    regressions = compare(results, baseline, args.threshold)
+    for arch, case, metric, before, after, change in regressions:
+        print(f"REGRESSION {arch} {case} {metric}: {before:.1f} -> {after:.1f} ({change:+.0%})")
+    print(f"{len(regressions)} regressions past {args.threshold:.0%} against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""Stress test of tiled rendering on huge PNGs through the real pipeline
+
+Usage:
+    python benchmarks/bench_tiled.py [--sizes 24 60 100] [--arch U2NETP] [--rows 256]
+
+Writes a synthetic PNG of each megapixel count to a temporary directory
+and runs ``remove_background`` on it at its original size, as a file-mode
+request does: decode, hash, preprocess and inference, then either the
+in-memory render (composite, encode, write) or ``write_png_tiled``
+(BG_TILED_MIN_MP forced above or below the image). The result caches are
+disabled. Each case runs in a fresh process, on the checkpoint in
+``--models-dir`` when there is one or on random weights otherwise (the
+model does not change the memory of the image stages), after a warm-up
+run on a small image so the network's own buffers are already allocated.
+
+Reports time, output size and the peak RSS added during the call. The
+forward pass costs the same at every image size (it runs at the network
+input size), so it is measured once more on the small image; "beyond"
+is the peak minus that and the decoded image (width x height x 3 bytes),
+i.e. what the image stages hold on top of their input.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from _common import (
+    CHECKPOINTS, current_rss_kb, encode_input, model_checkpoint, peak_rss_kb, reset_peak_rss, run_in_fresh_process,
+    synthetic_image,
+)
+
+# BG_TILED_MIN_MP per pipeline: never tile, or always tile
+PIPELINES = {
+    "in-memory": "1000000",
+    "tiled": "0",
+}
+
+
+def _measure(name, path, arch, models_dir, rows):
+    # Configure before config is imported; every run must decode, hash and infer
+    os.environ["BG_TILED_MIN_MP"] = PIPELINES[name]
+    os.environ["BG_TILE_ROWS"] = str(rows)
+    os.environ["BG_MASK_CACHE_MB"] = "0"
+    os.environ["BG_MASK_CACHE_DISK_DIR"] = ""
+    os.environ["BG_RENDER_CACHE_MB"] = "0"
+    from PIL import Image
+
+    from background_removal import peek_size, remove_background
+
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        model_path, weights = model_checkpoint(arch, models_dir, scratch_dir)
+        warmup = os.path.join(scratch_dir, "warmup.png")
+        synthetic_image(0.3).save(warmup)
+        output = os.path.join(scratch_dir, "output.png")
+        remove_background(warmup, output, model_path=model_path, arch=arch)
+        reset_peak_rss()
+        rss_before = current_rss_kb()
+        remove_background(warmup, output, model_path=model_path, arch=arch)
+        forward_mb = max(0, peak_rss_kb() - rss_before) / 1024
+
+        width, height = peek_size(path)
+        reset_peak_rss()
+        rss_before = current_rss_kb()
+        start = time.perf_counter()
+        remove_background(path, output, model_path=model_path, arch=arch)
+        elapsed = time.perf_counter() - start
+        peak_extra_mb = max(0, peak_rss_kb() - rss_before) / 1024
+        output_mb = os.path.getsize(output) / (1024 * 1024)
+        with Image.open(output) as result:
+            assert result.size == (width, height) and result.mode == "RGBA"
+
+    decoded_mb = width * height * 3 / (1024 * 1024)
+    return {
+        "weights": weights,
+        "seconds": elapsed,
+        "output_mb": output_mb,
+        "decoded_mb": decoded_mb,
+        "peak_extra_mb": peak_extra_mb,
+        "forward_mb": forward_mb,
+        "beyond_mb": peak_extra_mb - decoded_mb - forward_mb,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[24, 60, 100], help="Megapixels")
+    parser.add_argument("--arch", default="U2NETP", choices=sorted(CHECKPOINTS))
+    parser.add_argument("--models-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "models"))
+    parser.add_argument("--rows", type=int, default=256, help="Rows per strip for the tiled path (BG_TILE_ROWS)")
+    parser.add_argument("--pipelines", nargs="+", default=list(PIPELINES), choices=list(PIPELINES))
+    args = parser.parse_args(argv)
+
+    print(f"{'MP':>5} {'pipeline':>10} {'seconds':>8} {'out MB':>7} {'decoded MB':>11} {'peak +MB':>9} "
+          f"{'forward MB':>11} {'beyond MB':>10}")
+    with tempfile.TemporaryDirectory() as input_dir:
+        for megapixels in args.sizes:
+            path = os.path.join(input_dir, f"{megapixels:g}mp.png")
+            with open(path, "wb") as f:
+                f.write(encode_input(synthetic_image(megapixels), "png"))
+            for name in args.pipelines:
+                result = run_in_fresh_process(_measure, name, path, args.arch, args.models_dir, args.rows)
+                print(f"{megapixels:>5g} {name:>10} {result['seconds']:>8.2f} {result['output_mb']:>7.1f} "
+                      f"{result['decoded_mb']:>11.1f} {result['peak_extra_mb']:>9.1f} "
+                      f"{result['forward_mb']:>11.1f} {result['beyond_mb']:>10.1f}")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
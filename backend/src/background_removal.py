@@ -1,83 +1,449 @@
-import torch
-from PIL import Image
-import numpy as np
-from u2net_model import U2NET
+import io
+import logging
 import os
+from PIL import Image
+import config
+import metrics
+from encoders import check_output, encode
+from model_registry import load_model
+from png_stream import PngStreamWriter
+from result_cache import bytes_digest, file_digest, image_digest, mask_cache, render_cache
+from timing import StageTimer
+from image_ops import INPUT_SIZE, alpha_strip, apply_alpha, fit_box, normalize_mask, preprocess, upsample_mask, upsample_mask_rows
+from refine import GuidedRefiner
 
-def remove_background(input_path, output_path, resolution="original", model_path="models/u2net.pth"):
-    """Remove background from image using U2-Net model"""
-    print(f"Starting background removal for {input_path}")
-    print(f"Model path: {model_path}")
-    print(f"Resolution: {resolution}")
+logger = logging.getLogger(__name__)
 
-    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    print(f"Using device: {device}")
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp"}
 
-    # Load model
-    net = U2NET(3, 1)
-    try:
-        # Try loading with weights_only=False for compatibility
-        state_dict = torch.load(model_path, map_location=device, weights_only=False)
-        net.load_state_dict(state_dict)
-    except TypeError:
-        # Fallback for older PyTorch versions
-        state_dict = torch.load(model_path, map_location=device)
-        net.load_state_dict(state_dict)
+# Stages reported by StageTimer, in pipeline order
+PIPELINE_STAGES = ["decode", "hash", "model_load", "preprocess", "inference", "resize", "upsample", "refine", "composite", "encode", "write"]
+
+RESOLUTIONS = {
+    "hd": (1280, 720),
+    "fullhd": (1920, 1080),
+    "4k": (3840, 2160),
+}
+
+def predict_mask(predict, img_tensor):
+    """Run a batch-of-one forward pass and return the raw mask map"""
+    pred = predict(img_tensor)
+    return pred[:, 0, :, :].cpu().numpy()[0]
+
+def read_source(source):
+    """Return the encoded bytes of a path, a file object or raw bytes"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return source
+    if hasattr(source, "read"):
+        return source.read()
+    with open(source, "rb") as f:
+        return f.read()
+
+def _open_source(source):
+    """Paths as they are, so Pillow reads the file itself; the encoded bytes of anything else
+
+    A decoded image keeps the buffer it was read from alive, so reading a
+    path into memory first would hold the whole encoded file next to its
+    pixels until the image is released.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return source
+    return read_source(source)
+
+def target_size(resolution, size):
+    """Size of the rendered output for ``resolution``, preserving the aspect ratio of ``size``"""
+    if resolution == "original":
+        return size
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unsupported resolution: {resolution}")
+    target_width, target_height = RESOLUTIONS[resolution]
+
+    orig_width, orig_height = size
+    aspect_ratio = orig_width / orig_height
+
+    if target_width / target_height > aspect_ratio:
+        # Adjust width to maintain aspect ratio
+        target_width = int(target_height * aspect_ratio)
+    else:
+        # Adjust height to maintain aspect ratio
+        target_height = int(target_width / aspect_ratio)
+    return (target_width, target_height)
+
+def check_input_size(input_size):
+    """Raise ValueError unless ``input_size`` is None, "auto" or one of BG_INFERENCE_SIZES"""
+    if input_size in (None, "auto") or str(input_size) in {str(size) for size in config.INFERENCE_SIZES}:
+        return
+    allowed = ", ".join(["auto", *(str(size) for size in config.INFERENCE_SIZES)])
+    raise ValueError(f"Invalid inference size: {input_size}. Allowed: {allowed}")
+
+def inference_size(image_size, input_size=None, fixed_size=None):
+    """Network input side for an image: the requested bucket, or for "auto" the smallest covering it
+
+    ``input_size`` defaults to BG_INFERENCE_SIZE. "auto" picks the smallest
+    bucket at least as large as the image's longest side, capped at the
+    320 training size, so thumbnails skip most of the compute. Graphs
+    exported at a fixed size (``fixed_size``) always get that size.
+    """
+    if fixed_size:
+        return fixed_size
+    input_size = input_size or config.INFERENCE_SIZE
+    if input_size != "auto":
+        return int(input_size)
+    longest = max(image_size)
+    buckets = sorted(size for size in config.INFERENCE_SIZES if size <= INPUT_SIZE) or [INPUT_SIZE]
+    return next((size for size in buckets if size >= longest), buckets[-1])
 
-    net.to(device)
-    net.eval()
-    print("Model loaded successfully")
+def decode_for_outputs(data, resolutions):
+    """Decode encoded bytes (or a path) at the lowest resolution that still covers every output size
 
-    image = Image.open(input_path).convert('RGB')
-    orig_size = image.size
+    JPEGs are decoded by libjpeg at 1/2, 1/4 or 1/8 scale (Pillow's draft
+    mode) when the largest output is that much smaller than the original,
+    so a 50 MP photo rendered at hd never materializes its full-size
+    pixels. Other formats decode at full size. Returns the image and the
+    size each resolution renders it at.
+    """
+    image = Image.open(io.BytesIO(data) if isinstance(data, (bytes, bytearray, memoryview)) else data)
+    sizes = {resolution: target_size(resolution, image.size) for resolution in resolutions}
+    largest = max(sizes.values(), key=lambda size: size[0] * size[1])
+    if image.format == "JPEG" and largest[0] < image.size[0] and largest[1] < image.size[1]:
+        image.draft('RGB', largest)
+    image.load()
+    return image, sizes
+
+def decode_for_output(data, resolution="original"):
+    """Single-output ``decode_for_outputs``; returns the image and its output size"""
+    image, sizes = decode_for_outputs(data, [resolution])
+    return image, sizes[resolution]
+
+def peek_size(source):
+    """Read the pixel size from the image header without decoding the pixels"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    with Image.open(source) as image:
+        return image.size
+
+def predict_small_mask(image, model_path="models/u2net.pth", inference_queue=None, cache_key=None, timer=None, arch="U2NET", input_size=None):
+    """Return the normalized uint8 mask for ``image`` at the network resolution, from the mask cache when possible
+
+    The network runs at the ``inference_size`` bucket for ``input_size``.
+    When letterboxed, the mask is cropped to the image's box, so it keeps
+    the image's aspect ratio rather than being square.
+    """
+    timer = timer or StageTimer()
+    mask_small = mask_cache.get(cache_key) if cache_key is not None else None
+    if mask_small is not None:
+        logger.debug("Mask cache hit, skipping inference")
+        return mask_small
+
+    # Reuse the process-wide warmed network instead of reloading the checkpoint
+    with timer.stage("model_load"):
+        model = load_model(model_path, arch=arch)
+    logger.debug("Using device: %s", model.device)
 
     # Preprocess
-    image = image.resize((320, 320))
-    img_np = np.array(image).astype(np.float32) / 255.0
-    img_np = img_np.transpose((2, 0, 1))
-    img_tensor = torch.from_numpy(img_np).unsqueeze(0).to(device)
+    size = inference_size(image.size, input_size, model.fixed_size)
+    box = fit_box(image.size, size) if config.INFERENCE_LETTERBOX else None
+    logger.debug("Inference at %dx%d (%s)", size, size, "letterboxed" if box else "stretched")
+    with timer.stage("preprocess"):
+        img_tensor = preprocess(image, size=size, device=model.device, box=box)
 
     # Predict mask
-    with torch.no_grad():
-        d1, *_ = net(img_tensor)
-    pred = d1[:, 0, :, :].cpu().numpy()[0]
-    pred = (pred - pred.min()) / (pred.max() - pred.min())
-    mask = Image.fromarray((pred * 255).astype(np.uint8)).resize(orig_size, Image.LANCZOS)
-
-    # Apply mask to original image
-    image = Image.open(input_path).convert('RGBA')
-    mask_np = np.array(mask) / 255.0
-    img_np = np.array(image)
-    img_np[..., 3] = (mask_np * 255).astype(np.uint8)
-    result = Image.fromarray(img_np, 'RGBA')
-
-    # Resize the result based on the selected resolution
-    if resolution != "original":
-        if resolution == "hd":
-            target_width, target_height = 1280, 720
-        elif resolution == "fullhd":
-            target_width, target_height = 1920, 1080
-        elif resolution == "4k":
-            target_width, target_height = 3840, 2160
+    with timer.stage("inference"):
+        if inference_queue is not None:
+            pred = inference_queue.predict(img_tensor)
         else:
-            raise ValueError(f"Unsupported resolution: {resolution}")
+            pred = predict_mask(model.predict, img_tensor)
+    if box is not None:
+        left, top, right, bottom = box
+        pred = pred[top:bottom, left:right]
+    mask_small = normalize_mask(pred)
+    if cache_key is not None:
+        mask_cache.put(cache_key, mask_small)
+    return mask_small
+
+def _report_refine(timer, size):
+    megapixels = size[0] * size[1] / 1e6
+    ms = timer.timings.get("refine", 0.0) * 1000
+    logger.info("Refined alpha at %.1f MP in %.0f ms (%.1f ms/MP)", megapixels, ms, ms / megapixels)
+
+def hard_mask(matte):
+    """Threshold a soft 'L' matte to a 0/255 mask"""
+    return matte.point(lambda v: 255 if v >= 128 else 0)
+
+def remove_background_image(image, resolution="original", model_path="models/u2net.pth", inference_queue=None, cache_key=None, timer=None, arch="U2NET", output_size=None, refine=False, output_kind="cutout", input_size=None):
+    """Remove background from an already decoded PIL image and return the RGBA result
+
+    When an ``inference_queue`` is given the forward pass is batched with
+    other concurrent requests instead of running on its own. ``cache_key``
+    (see ``result_cache.image_digest``) lets a repeated image reuse its
+    predicted mask and skip inference. Stage durations are recorded on
+    ``timer`` when one is passed. ``output_size`` overrides the size derived
+    from ``resolution`` and ``image.size``, for images decoded at reduced
+    scale (see ``decode_for_output``). ``refine`` replaces the plain mask
+    upsample with the guided-filter alpha of ``refine.GuidedRefiner``.
+    ``output_kind`` "matte" returns the alpha itself as an 'L' image and
+    "mask" the alpha thresholded to 0/255. ``input_size`` selects the
+    network input bucket (see ``inference_size``).
+    """
+    timer = timer or StageTimer()
+    logger.debug("Model path: %s, resolution: %s", model_path, resolution)
+
+    output_size = output_size or target_size(resolution, image.size)
+    mask_small = predict_small_mask(image, model_path, inference_queue, cache_key, timer, arch, input_size)
+
+    # Resize the pixels before compositing so only the output size is ever made RGBA.
+    # Mask outputs only need them as the guide for refinement.
+    if image.size != output_size and (output_kind == "cutout" or refine):
+        logger.debug("Resizing image to resolution: %s, size: %s", resolution, output_size)
+        with timer.stage("resize"):
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert('RGBA')
+            image = image.resize(output_size, Image.LANCZOS)
+
+    if refine:
+        with timer.stage("refine"):
+            mask = GuidedRefiner(image, mask_small).full_alpha(image)
+        _report_refine(timer, output_size)
+    else:
+        # Scale the mask straight to the output size rather than via the original size
+        with timer.stage("upsample"):
+            mask = upsample_mask(mask_small, output_size)
+
+    if output_kind == "matte":
+        return mask
+    if output_kind == "mask":
+        with timer.stage("composite"):
+            return hard_mask(mask)
 
-        # Preserve aspect ratio
-        orig_width, orig_height = result.size
-        aspect_ratio = orig_width / orig_height
+    with timer.stage("composite"):
+        result = apply_alpha(image, mask)
 
-        if target_width / target_height > aspect_ratio:
-            # Adjust width to maintain aspect ratio
-            target_width = int(target_height * aspect_ratio)
+    return result
+
+def is_tiled(image, output_size, fmt="png", output_kind="cutout"):
+    """Whether an output is large enough to be composited and encoded strip by strip"""
+    return (fmt == "png" and output_kind == "cutout" and image.size == output_size
+            and output_size[0] * output_size[1] >= config.TILED_MIN_PIXELS)
+
+def write_png_tiled(image, fp, model_path="models/u2net.pth", inference_queue=None, cache_key=None, timer=None, arch="U2NET", refine=False, input_size=None):
+    """Composite and PNG-encode ``image`` into ``fp`` one strip of rows at a time
+
+    Besides the decoded input and the forward pass, the render holds a
+    few strips and the encoder's buffers, so its memory stays flat as the
+    image grows where rendering in memory grows with it (measure with
+    benchmarks/bench_tiled.py; see ``image_ops.upsample_mask_rows`` and
+    ``PngStreamWriter``). With ``refine`` each strip's alpha comes from
+    the guided filter instead.
+    """
+    timer = timer or StageTimer()
+    logger.info("Tiled rendering of %dx%d in strips of %d rows", image.size[0], image.size[1], config.TILE_ROWS)
+    mask_small = predict_small_mask(image, model_path, inference_queue, cache_key, timer, arch, input_size)
+
+    refiner = None
+    if refine:
+        with timer.stage("refine"):
+            refiner = GuidedRefiner(image, mask_small)
+
+    width, height = image.size
+    writer = PngStreamWriter(fp, image.size, compress_level=config.PNG_COMPRESS_LEVEL)
+    for top in range(0, height, config.TILE_ROWS):
+        bottom = min(top + config.TILE_ROWS, height)
+        if refiner is not None:
+            with timer.stage("refine"):
+                alpha = refiner.alpha(image.crop((0, top, width, bottom)), top)
+        else:
+            with timer.stage("upsample"):
+                alpha = upsample_mask_rows(mask_small, image.size, top, bottom)
+        with timer.stage("composite"):
+            strip = alpha_strip(image, top, bottom, alpha)
+        with timer.stage("encode"):
+            writer.write(strip)
+    with timer.stage("encode"):
+        writer.close()
+    if refine:
+        _report_refine(timer, image.size)
+
+def model_cache_key(model_path, input_size=None):
+    """Everything besides the pixels that a cached mask depends on
+
+    The weights (the file's path, size and modification time), the map the
+    model returns, the runtime serving it, BatchNorm folding and how the
+    network input was shaped. The disk tier of the mask cache outlives the
+    process, so a changed setting must not match masks from the old one.
+    """
+    try:
+        stat = os.stat(model_path)
+        weights = f"{model_path}:{stat.st_size}:{stat.st_mtime_ns}"
+    except OSError:
+        weights = str(model_path)
+    shaping = "letterbox" if config.INFERENCE_LETTERBOX else "stretch"
+    sizes = ",".join(str(size) for size in config.INFERENCE_SIZES)
+    return "|".join([
+        weights, config.INFERENCE_OUTPUT, config.INFERENCE_BACKEND, f"fuse={int(config.FUSE_BATCHNORM)}",
+        f"{input_size or config.INFERENCE_SIZE}/{sizes}", shaping,
+    ])
+
+def _cache_key(data, image, model_path, input_size=None):
+    model_key = model_cache_key(model_path, input_size)
+    if image.format == "JPEG":
+        if isinstance(data, (str, os.PathLike)):
+            return file_digest(data, model_key)
+        return bytes_digest(data, model_key)
+    return image_digest(image, model_key)
+
+def _decode_source(source, resolution, model_path, timer, input_size=None):
+    """Decode ``source`` for ``resolution`` and compute its cache key"""
+    with timer.stage("decode"):
+        data = _open_source(source)
+        image, output_size = decode_for_output(data, resolution)
+    with timer.stage("hash"):
+        cache_key = _cache_key(data, image, model_path, input_size)
+    return image, output_size, cache_key
+
+def _render_cached(image, output_size, cache_key, resolution, model_path, inference_queue, timer, arch, refine, fmt, output_kind, input_size=None):
+    render_key = (cache_key, resolution, refine, fmt, output_kind)
+    data = render_cache.get(render_key)
+    if data is not None:
+        logger.debug("Render cache hit")
+        return data
+
+    if is_tiled(image, output_size, fmt, output_kind):
+        buffer = io.BytesIO()
+        write_png_tiled(image, buffer, model_path, inference_queue, cache_key, timer, arch, refine, input_size)
+        data = buffer.getvalue()
+    else:
+        result = remove_background_image(
+            image,
+            resolution=resolution,
+            model_path=model_path,
+            inference_queue=inference_queue,
+            cache_key=cache_key,
+            timer=timer,
+            arch=arch,
+            output_size=output_size,
+            refine=refine,
+            output_kind=output_kind,
+            input_size=input_size,
+        )
+
+        with timer.stage("encode"):
+            data = encode(result, fmt)
+    logger.debug("Encoded %s as %s: %d bytes in %.0f ms", output_kind, fmt, len(data), timer.timings.get("encode", 0.0) * 1000)
+    render_cache.put(render_key, data)
+    return data
+
+def render_output(source, resolution, model_path, inference_queue, timer=None, arch="U2NET", refine=False, fmt="png", output_kind="cutout", input_size=None):
+    """Decode an encoded image and return its rendered output encoded as ``fmt``
+
+    ``source`` is a path, a file object or the encoded bytes. Masks and
+    renders are reused from the caches: draft-decoded JPEGs are keyed on
+    their encoded bytes, since their decoded pixels depend on the requested
+    resolution; everything else is keyed on its decoded pixels.
+    """
+    check_output(fmt, output_kind)
+    check_input_size(input_size)
+    with metrics.observing(timer or StageTimer()) as timer:
+        image, output_size, cache_key = _decode_source(source, resolution, model_path, timer, input_size)
+        return _render_cached(image, output_size, cache_key, resolution, model_path, inference_queue, timer, arch, refine, fmt, output_kind, input_size)
+
+def render_renditions(source, renditions, model_path="models/u2net.pth", inference_queue=None, timer=None, arch="U2NET", refine=False, output_kind="cutout", input_size=None):
+    """Render several ``(resolution, fmt)`` outputs of one image from one decode and one mask prediction
+
+    The image is decoded once at a scale covering the largest output,
+    which is rendered as in ``remove_background_image``. Every smaller
+    size is then downscaled from the next larger rendered size rather than
+    from the source, and each size is encoded once per requested format.
+    Returns ``{(resolution, fmt): bytes}``; encoded outputs are shared
+    with the single-output render cache.
+    """
+    for _, fmt in renditions:
+        check_output(fmt, output_kind)
+    check_input_size(input_size)
+    with metrics.observing(timer or StageTimer()) as timer:
+        return _render_renditions(source, renditions, model_path, inference_queue, timer, arch, refine, output_kind, input_size)
+
+def _render_renditions(source, renditions, model_path, inference_queue, timer, arch, refine, output_kind, input_size):
+    with timer.stage("decode"):
+        data = _open_source(source)
+        image, sizes = decode_for_outputs(data, [resolution for resolution, _ in renditions])
+    with timer.stage("hash"):
+        cache_key = _cache_key(data, image, model_path, input_size)
+
+    outputs = {}
+    for resolution, fmt in renditions:
+        cached = render_cache.get((cache_key, resolution, refine, fmt, output_kind))
+        if cached is not None:
+            outputs[(resolution, fmt)] = cached
+    missing = [rendition for rendition in renditions if rendition not in outputs]
+    if not missing:
+        logger.debug("Render cache hit for every rendition")
+        return outputs
+
+    # Hard masks are thresholded per size, so the chain carries the soft matte
+    render_kind = "matte" if output_kind == "mask" else output_kind
+    level = None
+    for size in sorted({sizes[resolution] for resolution, _ in missing}, key=lambda size: size[0] * size[1], reverse=True):
+        if level is None:
+            level = remove_background_image(
+                image,
+                resolution=next(resolution for resolution, _ in missing if sizes[resolution] == size),
+                model_path=model_path,
+                inference_queue=inference_queue,
+                cache_key=cache_key,
+                timer=timer,
+                arch=arch,
+                output_size=size,
+                refine=refine,
+                output_kind=render_kind,
+                input_size=input_size,
+            )
         else:
-            # Adjust height to maintain aspect ratio
-            target_height = int(target_width / aspect_ratio)
+            with timer.stage("resize"):
+                level = level.resize(size, Image.LANCZOS)
+        result = hard_mask(level) if output_kind == "mask" else level
+
+        for resolution, fmt in missing:
+            if sizes[resolution] != size:
+                continue
+            with timer.stage("encode"):
+                encoded = encode(result, fmt)
+            logger.debug("Rendered %s %dx%d as %s: %d bytes", resolution, size[0], size[1], fmt, len(encoded))
+            render_cache.put((cache_key, resolution, refine, fmt, output_kind), encoded)
+            outputs[(resolution, fmt)] = encoded
+    return {rendition: outputs[rendition] for rendition in renditions}
+
+def remove_background(input_path, output_path, resolution="original", model_path="models/u2net.pth", inference_queue=None, timer=None, arch="U2NET", refine=False, fmt="png", output_kind="cutout", input_size=None):
+    """Remove background from image using U2-Net model
 
-        new_size = (target_width, target_height)
-        print(f"Resizing image to resolution: {resolution}, size: {new_size}")
-        result = result.resize(new_size, Image.LANCZOS)
+    ``input_path`` may also be a file object or the encoded image bytes.
+    Cut-outs of BG_TILED_MIN_MP megapixels or more written as PNG are
+    streamed to ``output_path`` strip by strip instead of being rendered
+    in memory (see ``write_png_tiled``). Paths are decoded from the file
+    rather than read into memory first.
+    """
+    check_output(fmt, output_kind)
+    check_input_size(input_size)
+    logger.debug("Starting background removal for %s", input_path if isinstance(input_path, (str, os.PathLike)) else "in-memory image")
+    with metrics.observing(timer or StageTimer()) as timer:
+        image, output_size, cache_key = _decode_source(input_path, resolution, model_path, timer, input_size)
 
-    # Save result
-    result.save(output_path)
-    print(f"Background removed successfully. Output saved to {output_path}")
+        if is_tiled(image, output_size, fmt, output_kind):
+            with open(output_path, "wb") as f:
+                write_png_tiled(image, f, model_path, inference_queue, cache_key, timer, arch, refine, input_size)
+        else:
+            data = _render_cached(image, output_size, cache_key, resolution, model_path, inference_queue, timer, arch, refine, fmt, output_kind, input_size)
+
+            # Save result
+            with timer.stage("write"):
+                with open(output_path, "wb") as f:
+                    f.write(data)
+    logger.debug("Background removed, output saved to %s", output_path)
     return output_path
+
+def remove_background_bytes(data, resolution="original", model_path="models/u2net.pth", inference_queue=None, timer=None, arch="U2NET", refine=False, fmt="png", output_kind="cutout", input_size=None):
+    """Remove background from encoded image bytes and return the encoded output, without touching disk"""
+    timer = timer or StageTimer()
+    logger.debug("Starting in-memory background removal (%d bytes)", len(data))
+    output = render_output(data, resolution, model_path, inference_queue, timer=timer, arch=arch, refine=refine, fmt=fmt, output_kind=output_kind, input_size=input_size)
+    logger.debug("Background removed (%d bytes)", len(output))
+    return output
@@ -0,0 +1,205 @@
+import contextlib
+import io
+import threading
+import time
+import zipfile
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path, PurePosixPath
+
+from background_removal import IMAGE_EXTENSIONS, render_output, render_renditions
+from inference_queue import InferenceQueue
+from model_registry import load_model
+
+
+class UploadTooLarge(ValueError):
+    """A batch upload over the image count or uncompressed size limit"""
+
+
+def output_name(name, fmt="png", output_kind="cutout"):
+    """Map an input name (possibly a path inside a zip) to a safe relative output name
+
+    Cut-outs are ``<stem>_output.<fmt>``; masks and mattes are
+    ``<stem>_<output_kind>_output.<fmt>``, so they never overwrite or stand
+    in for each other.
+    """
+    parts = [part for part in PurePosixPath(name.replace("\\", "/")).parts if part not in ("", ".", "..", "/")]
+    stem = PurePosixPath(*parts).with_suffix("") if parts else PurePosixPath("image")
+    suffix = "" if output_kind == "cutout" else f"_{output_kind}"
+    return f"{stem.as_posix()}{suffix}_output.{fmt}"
+
+
+def process_many(items, handle_result, resolution="original", model_path="models/u2net.pth",
+                 workers=4, inference_queue=None, batch_size=8, max_wait_ms=10, on_progress=None,
+                 refine=False, fmt="png", output_kind="cutout", input_size=None, arch="U2NET"):
+    """Remove backgrounds from many images with decode, inference and encode overlapping
+
+    ``items`` yields ``(name, source)`` pairs where source is a path or raw
+    bytes, and ``handle_result(name, data)`` is called from worker threads
+    with each image's output encoded as ``fmt``. Forward passes of the workers are
+    batched through ``inference_queue`` (one is created for the run when
+    not given). ``arch`` is the architecture of the checkpoint at
+    ``model_path``. At most ``2 * workers`` images are held in flight, so
+    arbitrarily long inputs stream through bounded memory.
+    """
+    own_queue = None
+    if inference_queue is None:
+        model = load_model(model_path, arch=arch)
+        own_queue = inference_queue = InferenceQueue(
+            model.predict, model.device, max_batch_size=batch_size, max_wait_ms=max_wait_ms
+        ).start()
+
+    def work(name, source):
+        data = render_output(source, resolution, model_path, inference_queue, arch=arch, refine=refine,
+                             fmt=fmt, output_kind=output_kind, input_size=input_size)
+        handle_result(name, data)
+
+    processed = 0
+    errors = []
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk") as pool:
+            pending = {}
+
+            def drain(return_when):
+                nonlocal processed
+                done, _ = wait(pending, return_when=return_when)
+                for future in done:
+                    name = pending.pop(future)
+                    try:
+                        future.result()
+                        processed += 1
+                    except Exception as e:
+                        errors.append({"name": name, "error": f"{type(e).__name__}: {e}"})
+                    if on_progress is not None:
+                        on_progress(processed, len(errors), time.perf_counter() - start)
+
+            for name, source in items:
+                pending[pool.submit(work, name, source)] = name
+                if len(pending) >= 2 * workers:
+                    drain(FIRST_COMPLETED)
+            if pending:
+                drain(ALL_COMPLETED)
+    finally:
+        if own_queue is not None:
+            own_queue.stop()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "processed": processed,
+        "failed": len(errors),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "images_per_sec": round(processed / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+
+def expand_uploads(uploads, max_images=None, max_unzipped_bytes=None):
+    """Turn (filename, bytes) uploads into image items, unpacking any zip archives
+
+    The image count and the uncompressed size of the zip members are
+    checked against the limits from the archives' directories before any
+    member is read (zipfile never inflates a member past its declared
+    size), so a zip bomb is rejected without being extracted. Raises
+    UploadTooLarge over a limit and ValueError for invalid uploads.
+    """
+    with contextlib.ExitStack() as stack:
+        sources = []
+        count = unzipped_bytes = 0
+        for filename, data in uploads:
+            suffix = Path(filename).suffix.lower()
+            if suffix == ".zip":
+                try:
+                    archive = stack.enter_context(zipfile.ZipFile(io.BytesIO(data)))
+                except zipfile.BadZipFile as e:
+                    raise ValueError(f"Invalid zip archive {filename}: {e}") from e
+                members = [info for info in archive.infolist()
+                           if not info.is_dir() and Path(info.filename).suffix.lower() in IMAGE_EXTENSIONS]
+                sources.append((archive, members))
+                count += len(members)
+                unzipped_bytes += sum(info.file_size for info in members)
+            elif suffix in IMAGE_EXTENSIONS:
+                sources.append((None, [(filename, data)]))
+                count += 1
+            else:
+                raise ValueError(f"Invalid file type: {suffix}")
+
+        if max_images is not None and count > max_images:
+            raise UploadTooLarge(f"Too many images: {count}. Maximum per request: {max_images}")
+        if max_unzipped_bytes is not None and unzipped_bytes > max_unzipped_bytes:
+            raise UploadTooLarge(f"Zip archives unpack to {unzipped_bytes / (1024 * 1024):.0f} MB. "
+                                 f"Maximum per request: {max_unzipped_bytes / (1024 * 1024):.0f} MB")
+
+        items = []
+        for archive, members in sources:
+            if archive is None:
+                items.extend(members)
+                continue
+            for info in members:
+                try:
+                    items.append((info.filename, archive.read(info)))
+                except zipfile.BadZipFile as e:
+                    raise ValueError(f"Invalid zip member {info.filename}: {e}") from e
+    return items
+
+
+def remove_backgrounds_to_zip(items, resolution="original", model_path="models/u2net.pth",
+                              workers=4, inference_queue=None, refine=False, fmt="png", output_kind="cutout",
+                              input_size=None, arch="U2NET"):
+    """Process (name, bytes) items and return a zip of ``fmt`` outputs plus run statistics
+
+    Inputs that fail are listed in an ``errors.txt`` in the zip, one
+    ``<name>: <error>`` line each.
+    """
+    buffer = io.BytesIO()
+    lock = threading.Lock()
+    used_names = set()
+
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        def add_result(name, data):
+            with lock:
+                out_name = output_name(name, fmt, output_kind)
+                base, counter = out_name, 1
+                while out_name in used_names:
+                    out_name = base.replace(f"_output.{fmt}", f"_{counter}_output.{fmt}")
+                    counter += 1
+                used_names.add(out_name)
+                # Encoded images are already compressed, so store them as is
+                archive.writestr(out_name, data)
+
+        stats = process_many(
+            items,
+            add_result,
+            resolution=resolution,
+            model_path=model_path,
+            workers=workers,
+            inference_queue=inference_queue,
+            refine=refine,
+            fmt=fmt,
+            output_kind=output_kind,
+            input_size=input_size,
+            arch=arch,
+        )
+        if stats["errors"]:
+            # Output names all end in _output.<fmt>, so this cannot collide
+            archive.writestr("errors.txt", "".join(f"{error['name']}: {error['error']}\n" for error in stats["errors"]))
+
+    return buffer.getvalue(), stats
+
+
+def renditions_to_zip(data, renditions, name="image", output_kind="cutout", **render_kwargs):
+    """Render ``(resolution, fmt)`` renditions of one image and zip them as ``<stem>_<resolution>.<fmt>``
+
+    Mask and matte outputs are named ``<stem>_<resolution>_<output>.<fmt>``.
+    Returns the zip bytes and the names it contains.
+    """
+    outputs = render_renditions(data, renditions, output_kind=output_kind, **render_kwargs)
+    stem = output_name(name).rsplit("_output.", 1)[0]
+    suffix = "" if output_kind == "cutout" else f"_{output_kind}"
+
+    buffer = io.BytesIO()
+    names = []
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for (resolution, fmt), encoded in outputs.items():
+            names.append(f"{stem}_{resolution}{suffix}.{fmt}")
+            archive.writestr(names[-1], encoded)
+    return buffer.getvalue(), names
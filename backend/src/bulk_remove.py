@@ -0,0 +1,105 @@
+"""Command-line bulk background removal for whole directories
+
+Usage:
+    python src/bulk_remove.py INPUT_DIR OUTPUT_DIR [--resolution hd] [--workers 8]
+
+Outputs mirror the input tree as ``<name>_output.<format>``
+(``<name>_<output>_output.<format>`` for masks and mattes). Outputs are
+written atomically, so an interrupted run can simply be restarted: images
+whose output of the requested kind and format already exists are skipped.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config
+from background_removal import IMAGE_EXTENSIONS, RESOLUTIONS
+from bulk import output_name, process_many
+from encoders import OUTPUT_FORMATS, OUTPUT_KINDS
+from model_registry import ARCHITECTURES
+
+
+def find_images(input_dir):
+    return sorted(
+        path for path in Path(input_dir).rglob("*")
+        if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Remove backgrounds from every image in a directory")
+    parser.add_argument("input_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--resolution", default="original", choices=["original", *RESOLUTIONS])
+    parser.add_argument("--model", default="src/models/u2net.pth", help="Path to the model checkpoint")
+    parser.add_argument("--arch", default="U2NET", choices=sorted(ARCHITECTURES))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=20)
+    parser.add_argument("--inference-size", default=None, choices=["auto", *map(str, config.INFERENCE_SIZES)],
+                        help="Network input side (default BG_INFERENCE_SIZE)")
+    parser.add_argument("--refine", action="store_true", help="Refine mask edges with the guided filter")
+    parser.add_argument("--format", default="png", choices=list(OUTPUT_FORMATS))
+    parser.add_argument("--output", default="cutout", choices=OUTPUT_KINDS,
+                        help="Cut-out image, hard 0/255 mask or soft alpha matte")
+    parser.add_argument("--no-resume", action="store_true", help="Reprocess images that already have an output")
+    args = parser.parse_args(argv)
+
+    input_dir = Path(args.input_dir)
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    images = find_images(input_dir)
+    todo = []
+    for path in images:
+        rel_name = path.relative_to(input_dir).as_posix()
+        if args.no_resume or not (output_dir / output_name(rel_name, args.format, args.output)).exists():
+            todo.append((rel_name, path))
+    print(f"Found {len(images)} images, {len(images) - len(todo)} already done, {len(todo)} to process")
+
+    def save(name, data):
+        out_path = output_dir / output_name(name, args.format, args.output)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = out_path.with_name(out_path.name + ".part")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, out_path)
+
+    last_report = [time.perf_counter()]
+
+    def progress(processed, failed, elapsed):
+        now = time.perf_counter()
+        if now - last_report[0] >= 5 or processed + failed == len(todo):
+            last_report[0] = now
+            rate = processed / elapsed if elapsed > 0 else 0.0
+            print(f"{processed + failed}/{len(todo)} done ({failed} failed), {rate:.2f} images/sec")
+
+    stats = process_many(
+        todo,
+        save,
+        resolution=args.resolution,
+        model_path=args.model,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        max_wait_ms=args.max_wait_ms,
+        on_progress=progress,
+        refine=args.refine,
+        fmt=args.format,
+        output_kind=args.output,
+        input_size=args.inference_size,
+        arch=args.arch,
+    )
+
+    for error in stats["errors"]:
+        print(f"FAILED {error['name']}: {error['error']}")
+    print(f"Processed {stats['processed']} images in {stats['seconds']}s "
+          f"({stats['images_per_sec']} images/sec), {stats['failed']} failed")
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
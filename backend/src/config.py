@@ -0,0 +1,121 @@
+import os
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+# Micro-batching of concurrent forward passes
+BATCH_MAX_SIZE = _env_int("BG_BATCH_MAX_SIZE", 8)
+BATCH_MAX_WAIT_MS = _env_float("BG_BATCH_MAX_WAIT_MS", 10)
+
+# Worker pool running the blocking pipeline ("thread" or "process").
+# Threads default to at least one batch worth of workers so the
+# inference queue can actually fill its batches.
+WORKER_POOL_KIND = os.environ.get("BG_WORKER_POOL", "thread")
+WORKER_COUNT = _env_int("BG_WORKERS", max(os.cpu_count() or 1, BATCH_MAX_SIZE))
+WORKER_MAX_QUEUE = _env_int("BG_WORKER_MAX_QUEUE", 16)
+RETRY_AFTER_S = _env_int("BG_RETRY_AFTER_S", 1)
+
+# Prefork serving (serve.py): worker processes forked from a parent that
+# loaded the weights, torch intra-op threads per worker (0 splits the cores
+# evenly between workers) and how often the parent logs per-worker memory
+SERVE_WORKERS = _env_int("BG_SERVE_WORKERS", 2)
+TORCH_THREADS = _env_int("BG_TORCH_THREADS", 0)
+MEMORY_REPORT_S = _env_float("BG_MEMORY_REPORT_S", 300)
+
+# Content-addressed caches. Masks are small (100 KB each) and reusable at
+# any resolution; rendered outputs are keyed by digest and resolution.
+MASK_CACHE_MB = _env_float("BG_MASK_CACHE_MB", 64)
+MASK_CACHE_DISK_DIR = os.environ.get("BG_MASK_CACHE_DISK_DIR", "")
+MASK_CACHE_DISK_MB = _env_float("BG_MASK_CACHE_DISK_MB", 512)
+RENDER_CACHE_MB = _env_float("BG_RENDER_CACHE_MB", 128)
+
+# Upper bounds on one batch request: images, and the uncompressed size of
+# the members of its zip archives (checked before anything is extracted)
+BULK_MAX_IMAGES = _env_int("BG_BULK_MAX_IMAGES", 500)
+BULK_MAX_UNZIPPED_MB = _env_float("BG_BULK_MAX_UNZIPPED_MB", 1024)
+
+# Asynchronous jobs
+JOB_BACKEND = os.environ.get("BG_JOB_BACKEND", "local")
+JOB_WORKERS = _env_int("BG_JOB_WORKERS", 2)
+JOB_MAX_QUEUE = _env_int("BG_JOB_MAX_QUEUE", 64)
+JOB_TTL_S = _env_float("BG_JOB_TTL_S", 3600)
+JOB_MAX_LONG_POLL_S = _env_float("BG_JOB_MAX_LONG_POLL_S", 30)
+
+# Inference runtime: "eager" serves u2net.pth, "torchscript" and "onnx"
+# serve the single-map artifacts written by export_model.py, "quantized"
+# serves the int8 TorchScript file written by quantize_model.py and "mmap"
+# maps the .safetensors weights written by convert_checkpoint.py zero-copy
+INFERENCE_BACKEND = os.environ.get("BG_INFERENCE_BACKEND", "eager")
+
+# Map the models return. "d0" is U2-Net's fused map, the one the service
+# has always returned. "d1" is an opt-in fast path: it skips the other
+# five side branches and the fusion, but d1 is a coarser map, so masks
+# change (compare the two with benchmarks/bench_forward.py --checkpoint).
+# The torchscript and onnx backends serve the <stem>_<map> files that
+# export_model.py --output writes
+INFERENCE_OUTPUT = os.environ.get("BG_INFERENCE_OUTPUT", "d0")
+
+# Network input side. Inputs are bucketed into BG_INFERENCE_SIZES so
+# batches and compiled graphs are shared between requests. BG_INFERENCE_SIZE
+# is the default bucket, or "auto" for the smallest bucket covering the
+# image (at most 320, the training size). Images are stretched to the
+# square as in training; BG_INFERENCE_LETTERBOX=1 instead scales them
+# preserving the aspect ratio and pads with their edge pixels (compare both
+# with benchmarks/bench_input_size.py on your own images and masks).
+INFERENCE_SIZES = tuple(int(size) for size in os.environ.get("BG_INFERENCE_SIZES", "192,256,320,448").split(","))
+INFERENCE_SIZE = os.environ.get("BG_INFERENCE_SIZE", "320")
+INFERENCE_LETTERBOX = os.environ.get("BG_INFERENCE_LETTERBOX", "0") != "0"
+
+# Fold BatchNorm into the preceding convolutions when loading for serving
+FUSE_BATCHNORM = os.environ.get("BG_FUSE_BATCHNORM", "1") != "0"
+
+# "auto" quality routing to the U2NETP fast tier: images up to this many
+# pixels, or any request once this many are already in flight
+FAST_TIER_MAX_PIXELS = _env_int("BG_FAST_TIER_MAX_PIXELS", 512 * 512)
+FAST_TIER_LOAD = _env_int("BG_FAST_TIER_LOAD", WORKER_COUNT)
+
+# Outputs of at least this many megapixels are composited and PNG-encoded
+# in strips of BG_TILE_ROWS rows, bounding memory for gigapixel scans
+TILED_MIN_PIXELS = int(_env_float("BG_TILED_MIN_MP", 24) * 1_000_000)
+TILE_ROWS = _env_int("BG_TILE_ROWS", 256)
+
+# Guided-filter edge refinement (per-request "refine" option): coefficients
+# are solved at this working size, with this window radius (in working
+# pixels) and regularization
+REFINE_WORK_SIZE = _env_int("BG_REFINE_WORK_SIZE", 1024)
+REFINE_RADIUS = _env_int("BG_REFINE_RADIUS", 8)
+REFINE_EPS = _env_float("BG_REFINE_EPS", 1e-3)
+
+# Output encoders. PNG level 1 is ~4x faster than Pillow's default of 6 on
+# a 4K cut-out for ~30% more bytes; WebP method 2 is ~1.5x faster than 4
+# at nearly the same size.
+PNG_COMPRESS_LEVEL = _env_int("BG_PNG_COMPRESS_LEVEL", 1)
+JPEG_QUALITY = _env_int("BG_JPEG_QUALITY", 90)
+JPEG_BACKGROUND = os.environ.get("BG_JPEG_BACKGROUND", "white")
+WEBP_QUALITY = _env_int("BG_WEBP_QUALITY", 90)
+WEBP_METHOD = _env_int("BG_WEBP_METHOD", 2)
+
+# Retention of uploads and rendered outputs. The janitor runs every
+# BG_JANITOR_INTERVAL_S; a TTL or quota of 0 disables that limit.
+JANITOR_INTERVAL_S = _env_float("BG_JANITOR_INTERVAL_S", 60)
+JANITOR_GRACE_S = _env_float("BG_JANITOR_GRACE_S", 60)
+OUTPUT_TTL_S = _env_float("BG_OUTPUT_TTL_S", 24 * 3600)
+OUTPUT_MAX_MB = _env_float("BG_OUTPUT_MAX_MB", 2048)
+UPLOAD_TTL_S = _env_float("BG_UPLOAD_TTL_S", 15 * 60)
+UPLOAD_MAX_MB = _env_float("BG_UPLOAD_MAX_MB", 1024)
+
+# Video and frame-sequence mode: frames whose mean absolute difference from
+# the last inferred frame (0-1, on a 64x64 grayscale thumbnail) is below the
+# threshold reuse its mask; smoothing blends each mask with the previous
+# one (0 disables it)
+SEQUENCE_DIFF_THRESHOLD = _env_float("BG_SEQUENCE_DIFF_THRESHOLD", 0.005)
+SEQUENCE_SMOOTHING = _env_float("BG_SEQUENCE_SMOOTHING", 0.0)
+
+# Server log level (DEBUG, INFO, WARNING, ERROR); OFF disables logging
+LOG_LEVEL = os.environ.get("BG_LOG_LEVEL", "INFO").upper()
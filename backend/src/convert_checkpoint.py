@@ -0,0 +1,107 @@
+"""Convert a U2NET / U2NETP .pth checkpoint to a memory-mapped .safetensors file
+
+Usage:
+    python src/convert_checkpoint.py --checkpoint src/models/u2net.pth [--arch U2NET] [--no-fuse]
+
+The output (``<checkpoint stem>.safetensors`` by default) is a flat tensor
+file in the safetensors layout that model_registry maps zero-copy instead
+of unpickling (BG_INFERENCE_BACKEND=mmap). By default the BatchNorm layers
+are folded before saving, so serving needs no fusion step and every weight
+stays a view of the mapping. The converted network is checked against the
+checkpoint (``--tolerance``), and the cold-start load time (with and
+without the first forward pass) and memory of both files are measured,
+each in a fresh process.
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from memory_usage import current_rss_kb, peak_rss_kb, reset_peak_rss
+from model_registry import ARCHITECTURES, build_network
+from tensor_file import save_file
+
+
+def convert(checkpoint, output_path, arch="U2NET", fuse=True):
+    net = build_network(str(checkpoint), arch=arch, device="cpu", output=None, fuse=fuse)
+    metadata = {"arch": arch, "fused": "1" if fuse else "0", "source": Path(checkpoint).name}
+    return save_file(net.state_dict(), output_path, metadata)
+
+
+def _time_load(model_path, arch, results):
+    # Importing torch peaks above its resident size
+    reset_peak_rss()
+    rss_before = current_rss_kb()
+    start = time.perf_counter()
+    # fuse=True as served; a folded file skips it
+    net = build_network(model_path, arch=arch, device="cpu", output="d0", fuse=True)
+    load_s = time.perf_counter() - start
+    load_peak_kb = peak_rss_kb()
+    # The first forward pass is where mapped weights are actually read in
+    with torch.no_grad():
+        net(torch.zeros(1, 3, 320, 320))
+    results.put({
+        "load_s": load_s,
+        "ready_s": time.perf_counter() - start,
+        "load_peak_extra_mb": max(0, load_peak_kb - rss_before) / 1024,
+        "peak_extra_mb": max(0, peak_rss_kb() - rss_before) / 1024,
+        "rss_extra_mb": max(0, current_rss_kb() - rss_before) / 1024,
+    })
+
+
+def measure_load(model_path, arch, runs):
+    """Median load time and memory of ``build_network`` in fresh processes (torch already imported)"""
+    ctx = multiprocessing.get_context("spawn")
+    samples = []
+    for _ in range(runs):
+        results = ctx.Queue()
+        proc = ctx.Process(target=_time_load, args=(str(model_path), arch, results))
+        proc.start()
+        samples.append(results.get())
+        proc.join()
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a .pth checkpoint to a memory-mapped tensor file")
+    parser.add_argument("--checkpoint", default="src/models/u2net.pth")
+    parser.add_argument("--arch", default="U2NET", choices=sorted(ARCHITECTURES))
+    parser.add_argument("--output", default=None, help="Defaults to <checkpoint dir>/<stem>.safetensors")
+    parser.add_argument("--no-fuse", action="store_true", help="Keep the BatchNorm layers (e.g. for fine-tuning)")
+    parser.add_argument("--tolerance", type=float, default=1e-5)
+    parser.add_argument("--runs", type=int, default=3, help="Fresh-process loads timed per file")
+    args = parser.parse_args(argv)
+
+    checkpoint = Path(args.checkpoint)
+    output_path = Path(args.output) if args.output else checkpoint.with_suffix(".safetensors")
+    convert(checkpoint, output_path, arch=args.arch, fuse=not args.no_fuse)
+    print(f"Saved {output_path} ({output_path.stat().st_size / (1024 * 1024):.1f} MB)")
+
+    x = torch.rand(1, 3, 320, 320, generator=torch.Generator().manual_seed(0))
+    with torch.no_grad():
+        expected = build_network(str(checkpoint), arch=args.arch, device="cpu", output="d0")(x)
+        actual = build_network(str(output_path), arch=args.arch, device="cpu", output="d0")(x)
+    max_diff = float((expected - actual).abs().max())
+    ok = max_diff <= args.tolerance
+    print(f"max |pth - mapped| on d0: {max_diff:.2e} ({'OK' if ok else 'MISMATCH'}, tolerance {args.tolerance:.0e})")
+
+    before = measure_load(checkpoint, args.arch, args.runs)
+    after = measure_load(output_path, args.arch, args.runs)
+    for label, result in (("pth", before), ("mapped", after)):
+        print(f"{label:>7}: load {result['load_s'] * 1000:7.1f} ms (peak +{result['load_peak_extra_mb']:.0f} MB), "
+              f"ready after first forward {result['ready_s'] * 1000:7.1f} ms (peak +{result['peak_extra_mb']:.0f} MB), "
+              f"resident +{result['rss_extra_mb']:.0f} MB")
+    print(f"load {before['load_s'] / after['load_s']:.1f}x faster, "
+          f"ready {before['ready_s'] / after['ready_s']:.1f}x faster")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
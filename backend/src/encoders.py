@@ -0,0 +1,55 @@
+import io
+
+from PIL import Image
+
+import config
+
+# Output file formats accepted by the API, as (Pillow format, media type)
+OUTPUT_FORMATS = {
+    "png": ("PNG", "image/png"),
+    "jpg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
+
+# What is encoded: the RGBA cut-out, a hard 0/255 mask or the soft alpha matte
+OUTPUT_KINDS = ("cutout", "mask", "matte")
+
+MEDIA_TYPES = {f".{fmt}": media_type for fmt, (_, media_type) in OUTPUT_FORMATS.items()}
+
+
+def media_type_for(filename):
+    """Content type of an output file from its extension"""
+    suffix = filename[filename.rfind("."):].lower() if "." in filename else ""
+    return MEDIA_TYPES.get(suffix, "application/octet-stream")
+
+
+def check_output(fmt, kind):
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Invalid format: {fmt}. Allowed: {', '.join(OUTPUT_FORMATS)}")
+    if kind not in OUTPUT_KINDS:
+        raise ValueError(f"Invalid output: {kind}. Allowed: {', '.join(OUTPUT_KINDS)}")
+
+
+def save_options(fmt):
+    """Encoder settings for ``fmt``, from the BG_PNG_* / BG_JPEG_* / BG_WEBP_* settings"""
+    if fmt == "png":
+        return {"compress_level": config.PNG_COMPRESS_LEVEL}
+    if fmt == "jpg":
+        return {"quality": config.JPEG_QUALITY}
+    return {"quality": config.WEBP_QUALITY, "method": config.WEBP_METHOD}
+
+
+def encode(image, fmt="png"):
+    """Encode a rendered RGBA or 'L' image as ``fmt`` and return the bytes
+
+    JPEG has no alpha channel, so cut-outs are flattened onto
+    BG_JPEG_BACKGROUND first.
+    """
+    pillow_format, _ = OUTPUT_FORMATS[fmt]
+    if fmt == "jpg" and image.mode == "RGBA":
+        background = Image.new("RGB", image.size, config.JPEG_BACKGROUND)
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, format=pillow_format, **save_options(fmt))
+    return buffer.getvalue()
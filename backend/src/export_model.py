@@ -0,0 +1,138 @@
+"""Export a U2NET checkpoint to single-map TorchScript and ONNX inference graphs
+
+Usage:
+    python src/export_model.py --checkpoint src/models/u2net.pth --format all
+
+The exported graphs return only the fused d0 map used by
+remove_background, so the sigmoids of the unused side maps are pruned
+from the graph. ``--output d1`` exports the opt-in d1 fast path instead
+(see BG_INFERENCE_OUTPUT). Every export is checked against the same map
+of the unmodified eager model (``--tolerance``); the command exits
+non-zero when the masks diverge.
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from inference_backends import EagerBackend, OnnxRuntimeBackend, SideOutput, TorchScriptBackend
+from model_registry import ARCHITECTURES, build_network
+
+
+def export_torchscript(net, output_path, size=320):
+    """Trace the single-map wrapper and freeze it (folding BatchNorm and pruning dead branches)
+
+    Backend-specific passes such as ``optimize_for_inference`` produce
+    graphs that cannot be serialized, so TorchScriptBackend applies them at
+    load time instead.
+    """
+    example = torch.zeros(1, 3, size, size)
+    with torch.no_grad():
+        traced = torch.jit.trace(SideOutput(net).eval(), example)
+        frozen = torch.jit.freeze(traced)
+    frozen.save(str(output_path))
+    return output_path
+
+
+def export_onnx(net, output_path, size=320, opset=17):
+    """Export the single-map wrapper to ONNX with dynamic batch and spatial dimensions"""
+    example = torch.zeros(1, 3, size, size)
+    export_kwargs = dict(
+        input_names=["input"],
+        output_names=["mask"],
+        dynamic_axes={"input": {0: "batch", 2: "height", 3: "width"}, "mask": {0: "batch", 2: "height", 3: "width"}},
+        opset_version=opset,
+    )
+    try:
+        torch.onnx.export(SideOutput(net).eval(), example, str(output_path), dynamo=False, **export_kwargs)
+    except TypeError:
+        # Older PyTorch versions have no dynamo switch
+        torch.onnx.export(SideOutput(net).eval(), example, str(output_path), **export_kwargs)
+    return output_path
+
+
+def _normalize(pred):
+    pred = pred - pred.min()
+    return pred / max(float(pred.max()), 1e-8)
+
+
+def check_parity(reference, candidate, inputs, tolerance=1e-3):
+    """Compare the normalized masks of two predict callables over the given inputs
+
+    Returns the worst absolute per-pixel difference and whether it is within
+    ``tolerance`` (masks are compared in [0, 1] after the same min/max
+    normalization remove_background applies).
+    """
+    worst = 0.0
+    for batch in inputs:
+        expected = reference(batch)[:, 0].cpu().numpy()
+        actual = candidate(batch)[:, 0].cpu().numpy()
+        for e, a in zip(expected, actual):
+            worst = max(worst, float(np.abs(_normalize(e) - _normalize(a)).max()))
+    return {"max_abs_diff": worst, "tolerance": tolerance, "ok": worst <= tolerance}
+
+
+def parity_inputs(image_dir=None, count=4, size=320, seed=0):
+    """Sample images from ``image_dir`` when given, otherwise seeded random batches"""
+    if image_dir:
+        from PIL import Image
+
+        paths = sorted(p for p in Path(image_dir).iterdir() if p.suffix.lower() in {".png", ".jpg", ".jpeg", ".webp", ".bmp"})
+        for path in paths[:count]:
+            image = Image.open(path).convert("RGB").resize((size, size))
+            img_np = np.array(image).astype(np.float32).transpose((2, 0, 1)) / 255.0
+            yield torch.from_numpy(img_np).unsqueeze(0)
+        return
+
+    generator = torch.Generator().manual_seed(seed)
+    for _ in range(count):
+        yield torch.rand(2, 3, size, size, generator=generator)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export single-map inference graphs for U2NET")
+    parser.add_argument("--checkpoint", default="src/models/u2net.pth")
+    parser.add_argument("--arch", default="U2NET", choices=sorted(ARCHITECTURES))
+    parser.add_argument("--format", default="all", choices=["torchscript", "onnx", "all"])
+    parser.add_argument("--output", default="d0", choices=["d0", "d1"], help="Map the graphs return")
+    parser.add_argument("--output-dir", default=None, help="Defaults to the checkpoint directory")
+    parser.add_argument("--check-images", default=None, help="Directory of sample images for the parity check")
+    parser.add_argument("--tolerance", type=float, default=1e-3)
+    args = parser.parse_args(argv)
+
+    checkpoint = Path(args.checkpoint)
+    output_dir = Path(args.output_dir) if args.output_dir else checkpoint.parent
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stem = checkpoint.stem
+
+    net = build_network(str(checkpoint), arch=args.arch, device="cpu", output=args.output)
+    # The same map picked out of all seven of the unfused model
+    full = build_network(str(checkpoint), arch=args.arch, device="cpu", output=None, fuse=False)
+    reference = EagerBackend(SideOutput(full, index=int(args.output[1])))
+
+    exported = []
+    if args.format in ("torchscript", "all"):
+        path = export_torchscript(net, output_dir / f"{stem}_{args.output}.pt")
+        exported.append((path, TorchScriptBackend(path, "cpu")))
+    if args.format in ("onnx", "all"):
+        path = export_onnx(net, output_dir / f"{stem}_{args.output}.onnx")
+        exported.append((path, OnnxRuntimeBackend(path, "cpu")))
+
+    failed = False
+    for path, backend in exported:
+        result = check_parity(reference, backend, parity_inputs(args.check_images), args.tolerance)
+        size_mb = path.stat().st_size / (1024 * 1024)
+        status = "OK" if result["ok"] else "MISMATCH"
+        print(f"{path} ({size_mb:.1f} MB): max abs mask diff {result['max_abs_diff']:.2e} [{status}]")
+        failed = failed or not result["ok"]
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import threading
+
+import numpy as np
+import torch
+from PIL import Image
+
+INPUT_SIZE = 320
+
+_INV_255 = np.float32(1.0 / 255.0)
+# Pixels per strip when an image is converted to RGB piecewise
+_CONVERT_STRIP_PIXELS = 1 << 20
+_buffers = threading.local()
+
+
+def _input_buffer(size):
+    """Per-thread reusable (3, size, size) float32 buffer for the network input"""
+    buffers = getattr(_buffers, "by_size", None)
+    if buffers is None:
+        buffers = _buffers.by_size = {}
+    buffer = buffers.get(size)
+    if buffer is None:
+        buffer = buffers[size] = np.empty((3, size, size), dtype=np.float32)
+    return buffer
+
+
+def fit_box(size, input_size):
+    """Box ``(left, top, right, bottom)`` an image of ``size`` fills when letterboxed into an ``input_size`` square"""
+    width, height = size
+    scale = input_size / max(width, height)
+    fitted_width = max(1, round(width * scale))
+    fitted_height = max(1, round(height * scale))
+    left = (input_size - fitted_width) // 2
+    top = (input_size - fitted_height) // 2
+    return (left, top, left + fitted_width, top + fitted_height)
+
+
+def _converted_band(image, band):
+    """Band ``band`` of ``image.convert('RGB')`` as an 'L' image, converted a strip of rows at a time"""
+    width, height = image.size
+    plane = Image.new('L', image.size)
+    rows = max(1, _CONVERT_STRIP_PIXELS // width)
+    for top in range(0, height, rows):
+        strip = image.crop((0, top, width, min(top + rows, height))).convert('RGB')
+        plane.paste(strip.getchannel(band), (0, top))
+    return plane
+
+
+def _downscale_rgb(image, size):
+    """``image.convert('RGB').resize(size, reducing_gap=3.0)`` without a full-size RGB copy
+
+    reducing_gap box-reduces by an integer factor first, so huge inputs are
+    not filtered at full resolution. Bands are resampled independently, so
+    RGB and L images are downscaled before converting. Large images of other
+    modes are converted and downscaled one band at a time, holding a single
+    full-size 8-bit plane instead of a 3-byte-per-pixel copy.
+    """
+    if image.mode in ('RGB', 'L'):
+        small = image.resize(size, reducing_gap=3.0)
+        return small if small.mode == 'RGB' else small.convert('RGB')
+    if image.size[0] * image.size[1] <= _CONVERT_STRIP_PIXELS:
+        return image.convert('RGB').resize(size, reducing_gap=3.0)
+    bands = []
+    for band in range(3):
+        plane = image.getchannel(band) if image.mode == 'RGBA' else _converted_band(image, band)
+        bands.append(plane.resize(size, reducing_gap=3.0))
+        # Release this plane before the next one is built
+        del plane
+    return Image.merge('RGB', bands)
+
+
+def preprocess(image, size=INPUT_SIZE, device="cpu", box=None):
+    """Resize to the network input and return a (1, 3, size, size) float32 tensor in [0, 1]
+
+    Scaling and the HWC to CHW transpose happen in a single pass into a
+    per-thread buffer, with no float64 or transposed temporaries. On CPU
+    the returned tensor shares that buffer, so it is only valid until the
+    same thread preprocesses its next image. With a ``box`` from
+    ``fit_box`` the image is letterboxed into it instead of stretched to
+    the square, and the margins repeat its edge pixels.
+    """
+    if box is None:
+        pixels = np.asarray(_downscale_rgb(image, (size, size)))
+    else:
+        left, top, right, bottom = box
+        pixels = np.asarray(_downscale_rgb(image, (right - left, bottom - top)))
+        pixels = np.pad(pixels, ((top, size - bottom), (left, size - right), (0, 0)), mode='edge')
+    buffer = _input_buffer(size)
+    np.multiply(pixels.transpose((2, 0, 1)), _INV_255, out=buffer, casting='unsafe')
+    return torch.from_numpy(buffer).unsqueeze(0).to(device)
+
+
+def normalize_mask(pred):
+    """Min/max-normalize a float32 prediction in place and return it as uint8 in [0, 255]"""
+    pred = np.asarray(pred, dtype=np.float32)
+    if not pred.flags.writeable:
+        pred = pred.copy()
+    low = pred.min()
+    span = pred.max() - low
+    pred -= low
+    # A constant prediction has no foreground; avoid dividing by zero
+    np.multiply(pred, np.float32(255.0) / span if span > 0 else np.float32(0.0), out=pred)
+    return pred.astype(np.uint8)
+
+
+def upsample_mask(mask_small, size):
+    """Scale a uint8 mask to ``size`` as an 'L' image (LANCZOS, computed by Pillow in 8-bit)"""
+    return Image.fromarray(mask_small, 'L').resize(size, Image.LANCZOS)
+
+
+def apply_alpha(image, mask):
+    """Return ``image`` as RGBA with ``mask`` (an 'L' image of the same size) as its alpha channel
+
+    The alpha band is written in place by Pillow, so no full-resolution
+    NumPy arrays are materialized.
+    """
+    result = image.convert('RGBA') if image.mode != 'RGBA' else image.copy()
+    result.putalpha(mask)
+    return result
+
+
+def upsample_mask_rows(mask_small, size, top, bottom):
+    """Rows ``top:bottom`` of ``upsample_mask(mask_small, size)``, resampled on their own
+
+    Pillow's ``resize(box=...)`` reads the neighbouring source rows the
+    filter needs, so strips match the full-size upsample to within one
+    level without it ever being materialized.
+    """
+    mask = Image.fromarray(mask_small, 'L')
+    scale = mask.height / size[1]
+    return mask.resize((size[0], bottom - top), Image.LANCZOS, box=(0, top * scale, mask.width, bottom * scale))
+
+
+def alpha_strip(image, top, bottom, alpha):
+    """Rows ``top:bottom`` of ``image`` as RGBA with ``alpha`` as their alpha channel"""
+    strip = image.crop((0, top, image.size[0], bottom))
+    if strip.mode != 'RGBA':
+        strip = strip.convert('RGBA')
+    strip.putalpha(alpha)
+    return strip
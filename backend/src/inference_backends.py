@@ -0,0 +1,125 @@
+import os
+
+import numpy as np
+import torch
+
+# Which runtime serves a model file, by extension
+BACKEND_EXTENSIONS = {
+    ".pth": "eager",
+    ".safetensors": "eager",
+    ".pt": "torchscript",
+    ".onnx": "onnx",
+}
+
+
+def backend_for_path(model_path):
+    ext = os.path.splitext(str(model_path))[1].lower()
+    if ext not in BACKEND_EXTENSIONS:
+        raise ValueError(f"Unsupported model file type: {ext}. Allowed: {', '.join(BACKEND_EXTENSIONS)}")
+    return BACKEND_EXTENSIONS[ext]
+
+
+def _select_map(outputs, index=0):
+    # Nets with an inference_output set already return their single map;
+    # otherwise the first of the seven is the fused d0 the service returns
+    return outputs if torch.is_tensor(outputs) else outputs[index]
+
+
+class SideOutput(torch.nn.Module):
+    """Wraps a U2NET so it returns only one of its sigmoid maps (the fused d0 by default)
+
+    Used for export: tracing this wrapper lets freezing/ONNX drop every
+    node that only feeds the unused side outputs.
+    """
+
+    def __init__(self, net, index=0):
+        super().__init__()
+        self.net = net
+        self.index = index
+
+    def forward(self, x):
+        return _select_map(self.net(x), self.index)
+
+
+class EagerBackend:
+    """The PyTorch module itself, run in eager mode"""
+
+    name = "eager"
+    # Input side the graph is fixed to, or None when it accepts any size
+    fixed_size = None
+
+    def __init__(self, net):
+        self.net = net
+
+    def __call__(self, batch):
+        with torch.no_grad():
+            return _select_map(self.net(batch))
+
+    def size_bytes(self):
+        tensors = list(self.net.parameters()) + list(self.net.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class TorchScriptBackend:
+    """A frozen TorchScript graph produced by export_model.py, returning one map"""
+
+    name = "torchscript"
+    fixed_size = None
+
+    def __init__(self, model_path, device):
+        module = torch.jit.load(str(model_path), map_location=device)
+        module.eval()
+        self.file_module = module
+        try:
+            self.module = torch.jit.optimize_for_inference(module)
+        except RuntimeError:
+            # Not every build/device supports the optimisation passes
+            self.module = module
+        self.model_path = str(model_path)
+        self.net = None
+
+    def __call__(self, batch):
+        with torch.no_grad():
+            return self.module(batch)
+
+    def size_bytes(self):
+        tensors = list(self.file_module.parameters()) + list(self.file_module.buffers())
+        size = sum(t.numel() * t.element_size() for t in tensors)
+        # Frozen graphs inline their weights as constants, so fall back to the file
+        return size or os.path.getsize(self.model_path)
+
+
+class OnnxRuntimeBackend:
+    """An ONNX graph produced by export_model.py, run with ONNX Runtime on CPU"""
+
+    name = "onnx"
+
+    def __init__(self, model_path, device):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise RuntimeError("The onnx backend requires the onnxruntime package") from e
+
+        if torch.device(device).type != "cpu":
+            raise ValueError("The onnx backend only runs on CPU")
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            str(model_path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Graphs exported before the spatial axes were dynamic only take their export size
+        height = model_input.shape[2]
+        self.fixed_size = height if isinstance(height, int) else None
+        self.model_path = str(model_path)
+        self.net = None
+
+    def __call__(self, batch):
+        inputs = batch.detach().cpu().numpy().astype(np.float32, copy=False)
+        pred = self.session.run(None, {self.input_name: inputs})[0]
+        return torch.from_numpy(pred)
+
+    def size_bytes(self):
+        return os.path.getsize(self.model_path)
@@ -0,0 +1,125 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import torch
+
+_STOP = object()
+
+
+class InferenceQueue:
+    """Collects preprocessed tensors from concurrent requests and runs them as one batch
+
+    Callers submit a (1, 3, H, W) tensor and receive a Future resolving to the
+    (H, W) mask map for that tensor. A background thread waits up to
+    ``max_wait_ms`` after the first pending item for up to ``max_batch_size``
+    items, runs a single ``predict(...)`` call per input shape and scatters
+    the masks back to the waiting futures. ``predict`` is a model's
+    ``LoadedModel.predict``, mapping (N, 3, H, W) to the (N, 1, H, W) mask map.
+    """
+
+    def __init__(self, predict, device, max_batch_size=8, max_wait_ms=10):
+        self.predict_batch = predict
+        self.device = device
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._last_batch_size = 0
+        self._batch_sizes = Counter()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="inference-queue", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, img_tensor):
+        future = Future()
+        self._queue.put((img_tensor, future))
+        return future
+
+    def predict(self, img_tensor):
+        """Blocking helper: submit a tensor and wait for its mask"""
+        return self.submit(img_tensor).result()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": self._batches,
+                "items": self._items,
+                "last_batch_size": self._last_batch_size,
+                "mean_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "batch_size_counts": dict(sorted(self._batch_sizes.items())),
+            }
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Finish this batch, then let the loop see the sentinel again
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = self._collect(item)
+
+            # Tensors of different spatial sizes cannot share one forward pass
+            groups = {}
+            for img_tensor, future in batch:
+                groups.setdefault(tuple(img_tensor.shape[1:]), []).append((img_tensor, future))
+            for group in groups.values():
+                self._run_batch(group)
+
+    def _run_batch(self, group):
+        tensors, futures = [], []
+        for img_tensor, future in group:
+            if future.set_running_or_notify_cancel():
+                tensors.append(img_tensor)
+                futures.append(future)
+        if not futures:
+            return
+        try:
+            batch = torch.cat(tensors, 0).to(self.device)
+            pred = self.predict_batch(batch)
+            masks = pred[:, 0, :, :].cpu().numpy()
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        with self._stats_lock:
+            self._batches += 1
+            self._items += len(futures)
+            self._last_batch_size = len(futures)
+            self._batch_sizes[len(futures)] += 1
+
+        for future, mask in zip(futures, masks):
+            future.set_result(mask)
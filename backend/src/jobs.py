@@ -0,0 +1,141 @@
+import threading
+import time
+import uuid
+
+from worker_pool import WorkerPool
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    """State of one asynchronous background removal, updated from a worker thread"""
+
+    def __init__(self, resolution, stages):
+        self.id = str(uuid.uuid4())
+        self.resolution = resolution
+        self.stages = stages
+        self.status = QUEUED
+        self.stage = None
+        self.output_file = None
+        self.error = None
+        self.timings = {}
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # Bumped on every change so long-polling clients can wait for news
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def _update(self, **changes):
+        with self._lock:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self.version += 1
+
+    def start(self):
+        self._update(status=RUNNING, started_at=time.time())
+
+    def set_stage(self, stage):
+        self._update(stage=stage)
+
+    def finish(self, output_file, timings):
+        self._update(status=DONE, stage=None, output_file=output_file, timings=timings, finished_at=time.time())
+
+    def fail(self, error, timings):
+        self._update(status=FAILED, error=error, timings=timings, finished_at=time.time())
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    def progress(self):
+        if self.status == DONE:
+            return 1.0
+        if self.stage in self.stages:
+            return round(self.stages.index(self.stage) / len(self.stages), 2)
+        return 0.0
+
+    def to_dict(self):
+        with self._lock:
+            timings = dict(self.timings)
+            if self.started_at is not None:
+                timings["queue_wait"] = round(self.started_at - self.created_at, 4)
+            if self.finished_at is not None and self.started_at is not None:
+                timings["total"] = round(self.finished_at - self.started_at, 4)
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": self.progress(),
+                "resolution": self.resolution,
+                "output_file": self.output_file,
+                "error": self.error,
+                "timings": timings,
+                "version": self.version,
+            }
+
+
+class LocalJobBackend:
+    """Default backend: runs jobs on an in-process bounded thread pool"""
+
+    def __init__(self, max_workers=2, max_queue=64):
+        self._pool = WorkerPool("thread", max_workers=max_workers, max_queue=max_queue)
+
+    def submit(self, fn, *args, **kwargs):
+        return self._pool.submit(fn, *args, **kwargs)
+
+    def stats(self):
+        return self._pool.stats()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+
+# Where jobs run, by BG_JOB_BACKEND. A backend provides submit(fn, *args,
+# **kwargs), raising PoolSaturated when full, plus stats() and shutdown()
+JOB_BACKENDS = {
+    "local": LocalJobBackend,
+}
+
+
+def create_backend(name, **kwargs):
+    if name not in JOB_BACKENDS:
+        raise ValueError(f"Unsupported job backend: {name}")
+    return JOB_BACKENDS[name](**kwargs)
+
+
+class JobStore:
+    """Keeps jobs by ID and forgets finished ones after ``ttl_s`` seconds"""
+
+    def __init__(self, ttl_s=3600):
+        self.ttl_s = ttl_s
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def add(self, job):
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl_s
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return counts
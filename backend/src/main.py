@@ -1,17 +1,45 @@
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from typing import List
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from fastapi.staticfiles import StaticFiles
+import asyncio
+import logging
 import os
 import sys
+import time
 import uuid
 import shutil
 from pathlib import Path
 
+from PIL import UnidentifiedImageError
+
 # Add the src directory to Python path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from background_removal import remove_background
+from background_removal import (
+    IMAGE_EXTENSIONS, PIPELINE_STAGES, RESOLUTIONS, check_input_size, peek_size, remove_background,
+    remove_background_bytes,
+)
+import model_registry
+import result_cache
+import storage
+import bulk
+import encoders
+import jobs
+from timing import StageTimer
+import tiers
+import config
+import metrics
+from inference_queue import InferenceQueue
+from worker_pool import WorkerPool, PoolSaturated
+
+# Leveled logging for the whole server; BG_LOG_LEVEL=OFF silences it
+if config.LOG_LEVEL == "OFF":
+    logging.disable(logging.CRITICAL)
+else:
+    logging.basicConfig(level=config.LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger("background_remover")
 
 app = FastAPI(title="Background Remover API")
 
@@ -29,9 +57,126 @@ UPLOAD_DIR = Path("src/uploads")
 OUTPUT_DIR = Path("src/outputs")
 MODELS_DIR = Path("src/models")
 
+# Model file served per tier for each inference backend (see export_model.py)
+MODEL_FILES = {
+    "full": {
+        "eager": "u2net.pth",
+        "torchscript": f"u2net_{config.INFERENCE_OUTPUT}.pt",
+        "onnx": f"u2net_{config.INFERENCE_OUTPUT}.onnx",
+        "quantized": "u2net_int8.pt",
+        "mmap": "u2net.safetensors",
+    },
+    "fast": {
+        "eager": "u2netp.pth",
+        "torchscript": f"u2netp_{config.INFERENCE_OUTPUT}.pt",
+        "onnx": f"u2netp_{config.INFERENCE_OUTPUT}.onnx",
+        "quantized": "u2netp_int8.pt",
+        "mmap": "u2netp.safetensors",
+    },
+}
+MODEL_PATHS = {tier: MODELS_DIR / files[config.INFERENCE_BACKEND] for tier, files in MODEL_FILES.items()}
+MODEL_PATH = MODEL_PATHS["full"]
+FAST_MODEL_PATH = MODEL_PATHS["fast"]
+
 for directory in [UPLOAD_DIR, OUTPUT_DIR, MODELS_DIR]:
     directory.mkdir(parents=True, exist_ok=True)
 
+# Shared batching queue per model tier, created once each model is loaded
+inference_queues = {}
+tier_latency = tiers.TierLatency()
+
+# Pool running the blocking pipeline so the event loop stays responsive
+worker_pool = None
+
+# Asynchronous jobs: where they run and their pollable state
+job_backend = None
+job_store = jobs.JobStore(ttl_s=config.JOB_TTL_S)
+
+# Retention of uploads left by failed requests and of rendered outputs
+janitor = storage.Janitor(
+    {
+        OUTPUT_DIR: (config.OUTPUT_TTL_S, int(config.OUTPUT_MAX_MB * 1024 * 1024)),
+        UPLOAD_DIR: (config.UPLOAD_TTL_S, int(config.UPLOAD_MAX_MB * 1024 * 1024)),
+    },
+    grace_s=config.JANITOR_GRACE_S,
+)
+janitor_task = None
+
+async def _run_janitor():
+    """Sweep storage periodically; the directory scan runs off the event loop"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            evicted = await loop.run_in_executor(None, janitor.sweep)
+            if evicted["expired"] or evicted["quota"]:
+                logger.info("Janitor evicted %d expired and %d over-quota files (%.1f MB)",
+                            evicted["expired"], evicted["quota"], evicted["bytes"] / (1024 * 1024))
+        except Exception:
+            logger.exception("Janitor sweep failed")
+        await asyncio.sleep(config.JANITOR_INTERVAL_S)
+
+@app.on_event("startup")
+async def load_models():
+    """Load the model once per process so requests reuse the warmed network"""
+    global worker_pool, job_backend, janitor_task
+
+    if config.WORKER_POOL_KIND == "process":
+        # Each worker process holds its own model, so no shared batching queue
+        worker_pool = WorkerPool(
+            "process",
+            max_workers=config.WORKER_COUNT,
+            max_queue=config.WORKER_MAX_QUEUE,
+            initializer=_preload_worker_model,
+        )
+    else:
+        worker_pool = WorkerPool(
+            "thread",
+            max_workers=config.WORKER_COUNT,
+            max_queue=config.WORKER_MAX_QUEUE,
+        )
+
+    job_backend = jobs.create_backend(
+        config.JOB_BACKEND,
+        max_workers=config.JOB_WORKERS,
+        max_queue=config.JOB_MAX_QUEUE,
+    )
+    if config.JANITOR_INTERVAL_S > 0:
+        janitor_task = asyncio.create_task(_run_janitor())
+
+    if not MODEL_PATH.exists():
+        logger.warning("Model not found at %s, it will be loaded on first request", MODEL_PATH)
+    if not FAST_MODEL_PATH.exists():
+        logger.info("Fast tier disabled: %s not found", FAST_MODEL_PATH)
+    if config.WORKER_POOL_KIND == "process":
+        return
+
+    for tier, model_path in MODEL_PATHS.items():
+        if not model_path.exists():
+            continue
+        model = model_registry.load_model(str(model_path), arch=tiers.TIER_ARCHS[tier])
+        inference_queues[tier] = InferenceQueue(
+            model.predict,
+            model.device,
+            max_batch_size=config.BATCH_MAX_SIZE,
+            max_wait_ms=config.BATCH_MAX_WAIT_MS,
+        ).start()
+
+def _preload_worker_model():
+    for tier, model_path in MODEL_PATHS.items():
+        if model_path.exists():
+            model_registry.load_model(str(model_path), arch=tiers.TIER_ARCHS[tier])
+
+@app.on_event("shutdown")
+async def stop_workers():
+    if janitor_task is not None:
+        janitor_task.cancel()
+    if job_backend is not None:
+        job_backend.shutdown()
+    if worker_pool is not None:
+        worker_pool.shutdown()
+    for inference_queue in inference_queues.values():
+        inference_queue.stop()
+
 @app.get("/")
 @app.head("/")
 async def root():
@@ -40,44 +185,137 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint - verifies API and model are ready"""
-    model_path = MODELS_DIR / "u2net.pth"
-    model_exists = model_path.exists()
+    model_exists = MODEL_PATH.exists()
+    model_loaded = model_registry.is_loaded(str(MODEL_PATH), arch="U2NET")
 
     status = {
         "status": "healthy" if model_exists else "unhealthy",
         "api": "running",
-        "model_loaded": model_exists,
+        "model_loaded": model_loaded,
+        "models": model_registry.loaded_models(),
+        "fast_tier_available": FAST_MODEL_PATH.exists(),
+        "tiers": tier_latency.stats(),
+        "inference_queues": {tier: q.stats() for tier, q in inference_queues.items()},
+        "worker_pool": worker_pool.stats() if worker_pool is not None else None,
+        "cache": result_cache.cache_stats(),
+        "jobs": job_store.stats(),
+        "job_backend": job_backend.stats() if job_backend is not None else None,
+        "storage": janitor.stats(),
     }
 
     if model_exists:
-        file_size_mb = model_path.stat().st_size / (1024 * 1024)
+        file_size_mb = MODEL_PATH.stat().st_size / (1024 * 1024)
         status["model_size_mb"] = round(file_size_mb, 1)
-        status["model_path"] = str(model_path)
+        status["model_path"] = str(MODEL_PATH)
 
     return status
 
+def _collect_metrics():
+    """Gauges and counters from the same stats /health reports, read at scrape time"""
+    queues = {tier: q.stats() for tier, q in inference_queues.items()}
+    caches = result_cache.cache_stats()
+    tier_stats = tier_latency.stats()
+    families = [
+        ("bg_inference_queue_depth", "gauge", "Requests waiting for an inference batch",
+         [({"tier": tier}, stats["queue_depth"]) for tier, stats in queues.items()]),
+        ("bg_inference_batches_total", "counter", "Inference batches run",
+         [({"tier": tier}, stats["batches"]) for tier, stats in queues.items()]),
+        ("bg_inference_items_total", "counter", "Images run through inference batches",
+         [({"tier": tier}, stats["items"]) for tier, stats in queues.items()]),
+        ("bg_tier_requests_total", "counter", "Requests served per model tier",
+         [({"tier": tier}, stats["requests"]) for tier, stats in tier_stats.items()]),
+        ("bg_cache_entries", "gauge", "Entries held by each in-memory cache",
+         [({"cache": name}, caches[name]["memory"]["entries"] if name == "masks" else caches[name]["entries"])
+          for name in caches]),
+        ("bg_cache_hits_total", "counter", "In-memory cache hits",
+         [({"cache": name}, caches[name]["memory"]["hits"] if name == "masks" else caches[name]["hits"])
+          for name in caches]),
+        ("bg_cache_misses_total", "counter", "In-memory cache misses",
+         [({"cache": name}, caches[name]["memory"]["misses"] if name == "masks" else caches[name]["misses"])
+          for name in caches]),
+        ("bg_jobs", "gauge", "Tracked jobs by status",
+         [({"status": status}, count) for status, count in job_store.stats().items()]),
+    ]
+    if worker_pool is not None:
+        pool = worker_pool.stats()
+        families += [
+            ("bg_worker_pool_in_flight", "gauge", "Requests running or queued on the worker pool",
+             [({}, pool["in_flight"])]),
+            ("bg_worker_pool_rejected_total", "counter", "Requests rejected with 503 by the worker pool",
+             [({}, pool["rejected"])]),
+        ]
+    storage_stats = janitor.stats()
+    families += [
+        ("bg_storage_bytes", "gauge", "Bytes kept in each storage directory at the last sweep",
+         [({"dir": root}, stored["bytes"]) for root, stored in storage_stats["stored"].items()]),
+        ("bg_storage_evicted_total", "counter", "Files evicted by the janitor",
+         [({"reason": reason}, storage_stats["evicted"][reason]) for reason in ("expired", "quota")]),
+    ]
+    return families
+
+metrics.REGISTRY.add_collector(_collect_metrics)
+
+@app.middleware("http")
+async def _observe_request(request, call_next):
+    """Record request latency under the route template, not the raw path"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=str(status),
+        )
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape endpoint: per-stage and per-route latency histograms plus server gauges"""
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.post("/api/remove-background")
 async def api_remove_background(
     file: UploadFile = File(...),
-    resolution: str = Form("original")
+    resolution: str = Form("original"),
+    response_mode: str = Form("file"),
+    quality: str = Form("full"),
+    refine: bool = Form(False),
+    output_format: str = Form("png", alias="format"),
+    output: str = Form("cutout"),
+    inference_size: str = Form(None)
 ):
     """
     Remove background from uploaded image
 
     - **file**: Image file (png, jpg, jpeg, gif, bmp, webp)
     - **resolution**: Output resolution (original, hd, fullhd, 4k)
+    - **response_mode**: "file" stores the result for /api/download, "stream"
+      decodes the upload in memory and returns the output (a cutout, mask or
+      matte encoded as ``format``) in this response
+    - **quality**: "full" (U2NET, the default), "fast" (U2NETP, for previews)
+      or "auto" (fast for thumbnails and under heavy load)
+    - **refine**: Sharpen hair and edges with a guided filter at the output size
+    - **format**: Output format (png, jpg, webp); JPG cut-outs are flattened
+      onto BG_JPEG_BACKGROUND
+    - **output**: "cutout" (the image with its background removed), "mask"
+      (hard 0/255 mask) or "matte" (soft alpha matte)
+    - **inference_size**: Network input side, one of BG_INFERENCE_SIZES or
+      "auto" (smallest covering the image); defaults to BG_INFERENCE_SIZE
     """
     input_path = None
     output_path = None
 
     try:
-        print(f"\n=== New background removal request ===")
-        print(f"Filename: {file.filename}")
-        print(f"Content-Type: {file.content_type}")
-        print(f"Resolution: {resolution}")
+        logger.info("Background removal request: %s (%s), resolution %s, %s",
+                    file.filename, file.content_type, resolution, response_mode)
 
         # Validate file type
-        allowed_extensions = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp"}
+        allowed_extensions = IMAGE_EXTENSIONS
         file_ext = Path(file.filename).suffix.lower()
 
         if file_ext not in allowed_extensions:
@@ -86,102 +324,548 @@ async def api_remove_background(
                 detail=f"Invalid file type: {file_ext}. Allowed: {', '.join(allowed_extensions)}"
             )
 
+        if response_mode not in ("file", "stream"):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid response mode: {response_mode}. Allowed: file, stream"
+            )
+
+        _check_resolution(resolution)
+
+        _check_quality(quality)
+
+        _check_output(output_format, output)
+        _check_input_size(inference_size)
+
+        if response_mode == "stream":
+            return await _remove_background_in_memory(file, resolution, quality, refine, output_format, output,
+                                                      inference_size)
+
         # Generate unique filenames
         unique_id = str(uuid.uuid4())
         input_filename = f"{unique_id}_input{file_ext}"
-        output_filename = f"{unique_id}_output.png"
+        output_filename = f"{unique_id}_output.{output_format}"
 
         input_path = UPLOAD_DIR / input_filename
-        output_path = OUTPUT_DIR / output_filename
+        output_path = storage.sharded_path(OUTPUT_DIR, output_filename)
 
         # Save uploaded file
-        print(f"Saving uploaded file to {input_path}")
-        with open(input_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        file_size_mb = input_path.stat().st_size / (1024 * 1024)
-        print(f"File saved successfully ({file_size_mb:.2f} MB)")
+        with metrics.timed_stage("upload"):
+            with open(input_path, "wb") as buffer:
+                shutil.copyfileobj(file.file, buffer)
+        logger.debug("Saved upload to %s (%d bytes)", input_path, input_path.stat().st_size)
 
         # Check if model exists
-        model_path = MODELS_DIR / "u2net.pth"
+        tier = _choose_tier(quality, input_path)
+        model_path = MODEL_PATHS[tier]
         if not model_path.exists():
-            print(f"ERROR: Model not found at {model_path}")
+            logger.error("Model not found at %s", model_path)
             input_path.unlink(missing_ok=True)
             raise HTTPException(
                 status_code=500,
                 detail="Model file not found. Please wait for model download or contact support."
             )
 
-        print(f"Model found at {model_path}")
-
-        # Process the image
-        print("Starting background removal process...")
-        remove_background(
+        # Process the image on the worker pool, keeping the event loop free
+        start = time.perf_counter()
+        timings = await worker_pool.run(
+            _remove_background_timed,
             str(input_path),
             str(output_path),
             resolution=resolution,
-            model_path=str(model_path)
+            model_path=str(model_path),
+            inference_queue=inference_queues.get(tier),
+            arch=tiers.TIER_ARCHS[tier],
+            refine=refine,
+            fmt=output_format,
+            output_kind=output,
+            input_size=inference_size
         )
+        tier_latency.record(tier, time.perf_counter() - start)
 
         # Verify output was created
         if not output_path.exists():
             raise Exception("Output file was not created")
 
-        output_size_mb = output_path.stat().st_size / (1024 * 1024)
-        print(f"Output file created successfully ({output_size_mb:.2f} MB)")
+        output_bytes = output_path.stat().st_size
 
         # Clean up input file
         input_path.unlink(missing_ok=True)
-        print(f"Input file cleaned up")
 
-        print(f"=== Request completed successfully ===\n")
+        logger.info("Request completed (%s tier, %d bytes of %s)", tier, output_bytes, output_format)
         return {
             "success": True,
             "output_file": output_filename,
+            "model_tier": tier,
+            "format": output_format,
+            "output": output,
+            "output_bytes": output_bytes,
+            "encode_s": timings.get("encode", 0.0),
             "message": "Background removed successfully"
         }
 
     except HTTPException:
         # Re-raise HTTP exceptions
+        if input_path and input_path.exists():
+            input_path.unlink(missing_ok=True)
         raise
+    except PoolSaturated as e:
+        logger.warning("Rejecting request, worker pool saturated: %s", e)
+        if input_path and input_path.exists():
+            input_path.unlink(missing_ok=True)
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please retry shortly.",
+            headers={"Retry-After": str(config.RETRY_AFTER_S)}
+        )
     except Exception as e:
-        print(f"ERROR: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Background removal failed: %s", e)
 
         # Clean up on error
         if input_path and input_path.exists():
             input_path.unlink(missing_ok=True)
-            print("Cleaned up input file after error")
         if output_path and output_path.exists():
             output_path.unlink(missing_ok=True)
-            print("Cleaned up output file after error")
 
         raise HTTPException(
             status_code=500,
             detail=f"Background removal failed: {str(e)}"
         )
 
+def _check_quality(quality):
+    if quality not in tiers.QUALITY_OPTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid quality: {quality}. Allowed: {', '.join(tiers.QUALITY_OPTIONS)}"
+        )
+
+def _check_resolution(resolution):
+    allowed_resolutions = ["original", *RESOLUTIONS]
+    if resolution not in allowed_resolutions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid resolution: {resolution}. Allowed: {', '.join(allowed_resolutions)}"
+        )
+
+def _check_output(output_format, output):
+    try:
+        encoders.check_output(output_format, output)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _check_input_size(inference_size):
+    try:
+        check_input_size(inference_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _remove_background_timed(*args, **kwargs):
+    """Worker side of a file-mode request; returns the stage timings to the event loop"""
+    timer = StageTimer()
+    remove_background(*args, timer=timer, **kwargs)
+    return timer.as_dict()
+
+def _remove_background_bytes_timed(data, **kwargs):
+    timer = StageTimer()
+    output = remove_background_bytes(data, timer=timer, **kwargs)
+    return output, timer.as_dict()
+
+def _check_image(source):
+    """Pixel size from an upload's image header; 400 when it is not a readable image"""
+    try:
+        return peek_size(source)
+    except (UnidentifiedImageError, OSError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
+
+def _choose_tier(quality, source):
+    """Route a request to a model tier from its header size and the current load"""
+    image_size = _check_image(source) if quality == "auto" else None
+    in_flight = worker_pool.stats()["in_flight"] if worker_pool is not None else 0
+    return tiers.choose_tier(quality, image_size, in_flight, fast_available=FAST_MODEL_PATH.exists())
+
+def _choose_batch_tier(quality, items):
+    """Route a whole batch to one tier; "auto" judges it by its largest image"""
+    image_size = None
+    if quality == "auto":
+        try:
+            image_size = max((peek_size(data) for _, data in items), key=lambda size: size[0] * size[1])
+        except Exception:
+            # Undecodable images fail on their own in the batch; route on load alone
+            image_size = None
+    in_flight = worker_pool.stats()["in_flight"] if worker_pool is not None else 0
+    return tiers.choose_tier(quality, image_size, in_flight, fast_available=FAST_MODEL_PATH.exists())
+
+async def _remove_background_in_memory(file, resolution, quality="full", refine=False, output_format="png", output="cutout",
+                                       inference_size=None):
+    """Decode the upload from the request body and return the encoded output without temp files"""
+    with metrics.timed_stage("upload"):
+        data = await file.read()
+    logger.info("Background removal request: %s (%d bytes), resolution %s, in memory",
+                file.filename, len(data), resolution)
+
+    tier = _choose_tier(quality, data)
+    model_path = MODEL_PATHS[tier]
+    if not model_path.exists():
+        logger.error("Model not found at %s", model_path)
+        raise HTTPException(
+            status_code=500,
+            detail="Model file not found. Please wait for model download or contact support."
+        )
+
+    start = time.perf_counter()
+    content, timings = await worker_pool.run(
+        _remove_background_bytes_timed,
+        data,
+        resolution=resolution,
+        model_path=str(model_path),
+        inference_queue=inference_queues.get(tier),
+        arch=tiers.TIER_ARCHS[tier],
+        refine=refine,
+        fmt=output_format,
+        output_kind=output,
+        input_size=inference_size
+    )
+    tier_latency.record(tier, time.perf_counter() - start)
+
+    output_filename = f"{Path(file.filename).stem}_output.{output_format}"
+    logger.info("Request completed (%s tier, %d bytes of %s)", tier, len(content), output_format)
+    return Response(
+        content=content,
+        media_type=encoders.OUTPUT_FORMATS[output_format][1],
+        headers={
+            "Content-Disposition": f'attachment; filename="{output_filename}"',
+            "X-Model-Tier": tier,
+            "X-Encode-Seconds": str(timings.get("encode", 0.0))
+        }
+    )
+
+def _parse_list(value):
+    """Comma-separated form field to a de-duplicated list, keeping the order"""
+    return list(dict.fromkeys(item.strip().lower() for item in value.split(",") if item.strip()))
+
+@app.post("/api/remove-background/renditions")
+async def api_remove_background_renditions(
+    file: UploadFile = File(...),
+    resolutions: str = Form("original,hd"),
+    formats: str = Form("png"),
+    quality: str = Form("full"),
+    refine: bool = Form(False),
+    output: str = Form("cutout"),
+    inference_size: str = Form(None)
+):
+    """
+    Render one image at several resolutions and formats from a single inference
+
+    - **file**: Image file (png, jpg, jpeg, gif, bmp, webp)
+    - **resolutions**: Comma-separated output resolutions (original, hd, fullhd, 4k)
+    - **formats**: Comma-separated output formats (png, jpg, webp); every
+      resolution is rendered in every format
+    - **quality**, **refine**, **output**, **inference_size**: As for
+      /api/remove-background
+
+    Returns a zip of ``<name>_<resolution>.<format>`` files.
+    """
+    logger.info("Renditions request: %s, resolutions %s, formats %s", file.filename, resolutions, formats)
+
+    file_ext = Path(file.filename).suffix.lower()
+    if file_ext not in IMAGE_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file type: {file_ext}. Allowed: {', '.join(IMAGE_EXTENSIONS)}"
+        )
+
+    resolution_list = _parse_list(resolutions)
+    format_list = _parse_list(formats)
+    allowed_resolutions = ["original", *RESOLUTIONS]
+    invalid = [resolution for resolution in resolution_list if resolution not in allowed_resolutions]
+    if invalid or not resolution_list:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid resolutions: {resolutions}. Allowed: {', '.join(allowed_resolutions)}"
+        )
+    if not format_list:
+        raise HTTPException(status_code=400, detail="No output format given")
+    for output_format in format_list:
+        _check_output(output_format, output)
+    _check_input_size(inference_size)
+    _check_quality(quality)
+
+    with metrics.timed_stage("upload"):
+        data = await file.read()
+    _check_image(data)
+    tier = _choose_tier(quality, data)
+    model_path = MODEL_PATHS[tier]
+    if not model_path.exists():
+        raise HTTPException(
+            status_code=500,
+            detail="Model file not found. Please wait for model download or contact support."
+        )
+
+    renditions = [(resolution, output_format) for resolution in resolution_list for output_format in format_list]
+    start = time.perf_counter()
+    try:
+        zip_bytes, names = await worker_pool.run(
+            bulk.renditions_to_zip,
+            data,
+            renditions,
+            name=file.filename,
+            output_kind=output,
+            model_path=str(model_path),
+            inference_queue=inference_queues.get(tier),
+            arch=tiers.TIER_ARCHS[tier],
+            refine=refine,
+            input_size=inference_size
+        )
+    except PoolSaturated:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please retry shortly.",
+            headers={"Retry-After": str(config.RETRY_AFTER_S)}
+        )
+    tier_latency.record(tier, time.perf_counter() - start)
+
+    logger.info("Rendered %d renditions (%s tier)", len(names), tier)
+    return Response(
+        content=zip_bytes,
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{Path(file.filename).stem}_renditions.zip"',
+            "X-Model-Tier": tier,
+            "X-Renditions": str(len(names))
+        }
+    )
+
+@app.post("/api/remove-background/batch")
+async def api_remove_background_batch(
+    files: List[UploadFile] = File(...),
+    resolution: str = Form("original"),
+    quality: str = Form("full"),
+    refine: bool = Form(False),
+    output_format: str = Form("png", alias="format"),
+    output: str = Form("cutout"),
+    inference_size: str = Form(None)
+):
+    """
+    Remove backgrounds from many images in one request
+
+    - **files**: Image files and/or zip archives of images
+    - **resolution**: Output resolution (original, hd, fullhd, 4k)
+    - **quality**: "full", "fast" or "auto" as for /api/remove-background;
+      the whole batch runs on one tier, chosen for its largest image
+    - **refine**: Sharpen hair and edges with a guided filter at the output size
+    - **format**: Output format (png, jpg, webp)
+    - **output**: "cutout", "mask" or "matte"
+    - **inference_size**: Network input side, a bucket or "auto"
+
+    Returns a zip of ``<name>_output.<format>`` files
+    (``<name>_<output>_output.<format>`` for masks and mattes), plus an
+    ``errors.txt`` naming each input that failed and why; run statistics
+    are in the X-Images-* response headers.
+    """
+    logger.info("Batch background removal request (%d uploads)", len(files))
+    _check_resolution(resolution)
+    _check_quality(quality)
+    _check_output(output_format, output)
+    _check_input_size(inference_size)
+
+    with metrics.timed_stage("upload"):
+        uploads = [(upload.filename, await upload.read()) for upload in files]
+    try:
+        items = bulk.expand_uploads(uploads, max_images=config.BULK_MAX_IMAGES,
+                                    max_unzipped_bytes=int(config.BULK_MAX_UNZIPPED_MB * 1024 * 1024))
+    except bulk.UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not items:
+        raise HTTPException(status_code=400, detail="No images found in upload")
+
+    tier = _choose_batch_tier(quality, items)
+    model_path = MODEL_PATHS[tier]
+    if not model_path.exists():
+        raise HTTPException(
+            status_code=500,
+            detail="Model file not found. Please wait for model download or contact support."
+        )
+
+    start = time.perf_counter()
+    try:
+        zip_bytes, stats = await worker_pool.run(
+            bulk.remove_backgrounds_to_zip,
+            items,
+            resolution=resolution,
+            model_path=str(model_path),
+            workers=config.WORKER_COUNT,
+            inference_queue=inference_queues.get(tier),
+            refine=refine,
+            fmt=output_format,
+            output_kind=output,
+            input_size=inference_size,
+            arch=tiers.TIER_ARCHS[tier]
+        )
+    except PoolSaturated:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please retry shortly.",
+            headers={"Retry-After": str(config.RETRY_AFTER_S)}
+        )
+
+    tier_latency.record(tier, time.perf_counter() - start)
+
+    logger.info("Batch done (%s tier): %d processed, %d failed, %s images/sec",
+                tier, stats["processed"], stats["failed"], stats["images_per_sec"])
+    return Response(
+        content=zip_bytes,
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": 'attachment; filename="backgrounds_removed.zip"',
+            "X-Model-Tier": tier,
+            "X-Images-Processed": str(stats["processed"]),
+            "X-Images-Failed": str(stats["failed"]),
+            "X-Images-Per-Sec": str(stats["images_per_sec"]),
+        }
+    )
+
+def _run_job(job, data, refine=False, output_format="png", output="cutout", inference_size=None, tier="full"):
+    """Worker side of a job: run the pipeline, reporting stages and timings on the job"""
+    job.start()
+    timer = StageTimer(listener=job.set_stage)
+    output_filename = f"{job.id}_output.{output_format}"
+    output_path = storage.sharded_path(OUTPUT_DIR, output_filename)
+    try:
+        remove_background(
+            data,
+            str(output_path),
+            resolution=job.resolution,
+            model_path=str(MODEL_PATHS[tier]),
+            inference_queue=inference_queues.get(tier),
+            arch=tiers.TIER_ARCHS[tier],
+            timer=timer,
+            refine=refine,
+            fmt=output_format,
+            output_kind=output,
+            input_size=inference_size
+        )
+        job.finish(output_filename, timer.as_dict())
+        logger.info("Job %s completed in %.2fs", job.id, time.time() - job.started_at)
+    except Exception as e:
+        logger.exception("Job %s failed", job.id)
+        output_path.unlink(missing_ok=True)
+        job.fail(f"{type(e).__name__}: {str(e)}", timer.as_dict())
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(
+    file: UploadFile = File(...),
+    resolution: str = Form("original"),
+    quality: str = Form("full"),
+    refine: bool = Form(False),
+    output_format: str = Form("png", alias="format"),
+    output: str = Form("cutout"),
+    inference_size: str = Form(None)
+):
+    """
+    Queue a background removal and return a job ID immediately
+
+    - **file**: Image file (png, jpg, jpeg, gif, bmp, webp)
+    - **resolution**: Output resolution (original, hd, fullhd, 4k)
+    - **quality**: "full", "fast" or "auto" as for /api/remove-background
+    - **refine**: Sharpen hair and edges with a guided filter at the output size
+    - **format**: Output format (png, jpg, webp)
+    - **output**: "cutout", "mask" or "matte"
+    - **inference_size**: Network input side, a bucket or "auto"
+
+    Poll ``GET /api/jobs/{job_id}`` for progress; the result is fetched
+    from ``/api/download/{output_file}`` once the job is done.
+    """
+    file_ext = Path(file.filename).suffix.lower()
+    if file_ext not in IMAGE_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file type: {file_ext}. Allowed: {', '.join(IMAGE_EXTENSIONS)}"
+        )
+    _check_resolution(resolution)
+    _check_quality(quality)
+    _check_output(output_format, output)
+    _check_input_size(inference_size)
+
+    with metrics.timed_stage("upload"):
+        data = await file.read()
+    # Reject what the worker could not decode before it is queued
+    _check_image(data)
+    tier = _choose_tier(quality, data)
+    if not MODEL_PATHS[tier].exists():
+        raise HTTPException(
+            status_code=500,
+            detail="Model file not found. Please wait for model download or contact support."
+        )
+    job = jobs.Job(resolution, PIPELINE_STAGES)
+    try:
+        job_backend.submit(_run_job, job, data, refine, output_format, output, inference_size, tier)
+    except PoolSaturated:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many queued jobs, please retry shortly.",
+            headers={"Retry-After": str(config.RETRY_AFTER_S)}
+        )
+    job_store.add(job)
+    logger.info("Queued job %s for %s (%s tier)", job.id, file.filename, tier)
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "model_tier": tier,
+        "poll_url": f"/api/jobs/{job.id}"
+    }
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0, since: int = -1):
+    """
+    Job status, progress and per-stage timings
+
+    - **wait**: Long-poll for up to this many seconds (max 30) until the job changes
+    - **since**: Version seen by the client; with ``wait``, return as soon as
+      the job version is newer (defaults to the version at request time)
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if wait > 0:
+        seen = since if since >= 0 else job.version
+        deadline = time.monotonic() + min(wait, config.JOB_MAX_LONG_POLL_S)
+        while not job.finished and job.version <= seen and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+    return job.to_dict()
+
+def _resolve_output(filename):
+    """Path of an output in its shard (or the flat layout of older outputs), or None"""
+    try:
+        return storage.resolve(OUTPUT_DIR, filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/api/download/{filename}")
 async def download_file(filename: str):
     """Download processed image"""
-    file_path = OUTPUT_DIR / filename
+    file_path = _resolve_output(filename)
 
-    if not file_path.exists():
+    if file_path is None:
         raise HTTPException(status_code=404, detail="File not found")
 
     return FileResponse(
         path=file_path,
         filename=filename,
-        media_type="image/png"
+        media_type=encoders.media_type_for(filename)
     )
 
 @app.delete("/api/cleanup/{filename}")
 async def cleanup_file(filename: str):
     """Delete processed file from server"""
-    file_path = OUTPUT_DIR / filename
+    file_path = _resolve_output(filename)
 
-    if file_path.exists():
+    if file_path is not None:
         file_path.unlink()
         return {"success": True, "message": "File deleted successfully"}
 
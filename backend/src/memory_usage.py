@@ -0,0 +1,46 @@
+"""Memory usage of processes, read from /proc (Linux only)"""
+import os
+
+
+def current_rss_kb():
+    """Resident size of this process in KB"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+def reset_peak_rss():
+    """Reset this process's resident high-water mark to its current size
+
+    Importing torch or building a test input peaks well above the resident
+    size, so measurements reset the mark before the code they measure.
+    """
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+
+
+def peak_rss_kb():
+    """Resident high-water mark of this process in KB, since start or ``reset_peak_rss``"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+
+
+def process_memory(pid="self"):
+    """Resident (RSS), proportional (PSS) and shared memory of a process in MB
+
+    RSS counts shared pages in full in every process that maps them; PSS
+    splits them between those processes, so the PSS of all workers sums to
+    their real footprint.
+    """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in ("Rss", "Pss", "Shared_Clean", "Shared_Dirty"):
+                fields[name] = int(value.split()[0]) / 1024
+    return {
+        "rss_mb": round(fields["Rss"], 1),
+        "pss_mb": round(fields["Pss"], 1),
+        "shared_mb": round(fields["Shared_Clean"] + fields["Shared_Dirty"], 1),
+    }
@@ -0,0 +1,176 @@
+import logging
+import os
+import threading
+import time
+
+import torch
+
+import config
+from inference_backends import EagerBackend, OnnxRuntimeBackend, TorchScriptBackend, backend_for_path
+from tensor_file import load_file
+from u2net_model import REBNCONV, U2NET, U2NETP, fuse_rebnconv
+
+ARCHITECTURES = {
+    "U2NET": U2NET,
+    "U2NETP": U2NETP,
+}
+
+logger = logging.getLogger(__name__)
+
+_models = {}
+_lock = threading.Lock()
+
+
+class LoadedModel:
+    """A warmed inference backend together with its load statistics
+
+    ``predict(batch)`` maps a (N, 3, H, W) tensor to the (N, 1, H, W) mask
+    map (the fused d0 unless BG_INFERENCE_OUTPUT opts into d1) whatever the
+    backend. ``net`` is the eager module, or None for exported graphs.
+    """
+
+    def __init__(self, backend, model_path, arch, device, load_time_s, size_bytes):
+        self.backend = backend
+        self.predict = backend
+        self.net = backend.net
+        self.model_path = model_path
+        self.arch = arch
+        self.device = device
+        self.fixed_size = backend.fixed_size
+        self.load_time_s = load_time_s
+        self.size_bytes = size_bytes
+
+    def info(self):
+        return {
+            "model_path": self.model_path,
+            "arch": self.arch,
+            "backend": self.backend.name,
+            "device": str(self.device),
+            "load_time_s": round(self.load_time_s, 3),
+            "resident_size_mb": round(self.size_bytes / (1024 * 1024), 1),
+        }
+
+
+def default_device():
+    return torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+
+def _read_state_dict(model_path, device):
+    try:
+        # Try loading with weights_only=False for compatibility
+        return torch.load(model_path, map_location=device, weights_only=False)
+    except TypeError:
+        # Fallback for older PyTorch versions
+        return torch.load(model_path, map_location=device)
+
+
+def _map_tensor_file(model_path, arch):
+    """Build ``arch`` around the memory-mapped weights of a tensor file (see convert_checkpoint.py)
+
+    The network is created on the meta device, so no weights are allocated
+    or randomly initialised, and ``assign=True`` makes the mapped tensors
+    its parameters. Files written from a BatchNorm-folded network have no
+    BatchNorm entries, so the blocks are folded structurally first.
+    """
+    state, metadata = load_file(model_path)
+    if metadata.get("arch", arch) != arch:
+        raise ValueError(f"{model_path} holds {metadata['arch']} weights, not {arch}")
+    with torch.device("meta"):
+        net = ARCHITECTURES[arch](3, 1)
+    if metadata.get("fused") == "1":
+        for module in net.modules():
+            if isinstance(module, REBNCONV):
+                module.bn_s1 = torch.nn.Identity()
+    net.load_state_dict(state, assign=True)
+    return net
+
+
+def build_network(model_path, arch="U2NET", device=None, output=config.INFERENCE_OUTPUT, fuse=config.FUSE_BATCHNORM):
+    """Instantiate an architecture, load a checkpoint into it and switch to eval mode
+
+    ``.pth`` checkpoints are unpickled into fresh memory; ``.safetensors``
+    files are mapped zero-copy on CPU. ``output`` ("d0", "d1" or None)
+    selects the inference-only forward path, which returns only that map;
+    "d1" also skips the branches that only feed the fused d0. ``fuse``
+    folds every BatchNorm into its convolution, so the result is for
+    inference only.
+    """
+    if arch not in ARCHITECTURES:
+        raise ValueError(f"Unsupported architecture: {arch}")
+    device = torch.device(device) if device is not None else default_device()
+    if str(model_path).endswith(".safetensors"):
+        net = _map_tensor_file(model_path, arch)
+    else:
+        net = ARCHITECTURES[arch](3, 1)
+        net.load_state_dict(_read_state_dict(model_path, device))
+    net.set_inference_output(output)
+    net.to(device)
+    net.eval()
+    if fuse:
+        fuse_rebnconv(net)
+    return net
+
+
+def _create_backend(model_path, arch, device):
+    backend = backend_for_path(model_path)
+    if backend == "eager":
+        return EagerBackend(build_network(model_path, arch=arch, device=device))
+    if backend == "torchscript":
+        return TorchScriptBackend(model_path, device)
+    return OnnxRuntimeBackend(model_path, device)
+
+
+def _key(model_path, arch, device):
+    return (os.path.abspath(model_path), arch, str(device))
+
+
+def load_model(model_path, arch="U2NET", device=None):
+    """Load a model once per (path, architecture, device) and return its LoadedModel
+
+    The runtime follows the file type: ``.pth`` checkpoints run eagerly,
+    ``.pt`` files are TorchScript and ``.onnx`` files run on ONNX Runtime
+    (see export_model.py).
+    """
+    if arch not in ARCHITECTURES:
+        raise ValueError(f"Unsupported architecture: {arch}")
+    device = torch.device(device) if device is not None else default_device()
+    key = _key(model_path, arch, device)
+
+    with _lock:
+        entry = _models.get(key)
+        if entry is not None:
+            return entry
+
+        logger.info("Loading %s weights from %s on %s", arch, model_path, device)
+        start = time.perf_counter()
+        backend = _create_backend(model_path, arch, device)
+
+        # Warm up so the first real request does not pay for lazy initialisation
+        backend(torch.zeros(1, 3, 320, 320, device=device))
+        load_time = time.perf_counter() - start
+
+        entry = LoadedModel(backend, str(model_path), arch, device, load_time, backend.size_bytes())
+        _models[key] = entry
+        logger.info("Model loaded in %.2fs (%s backend)", load_time, backend.name)
+        return entry
+
+
+def get_model(model_path, arch="U2NET", device=None):
+    """Return the warmed predict callable for a model, loading it on first use"""
+    return load_model(model_path, arch=arch, device=device).predict
+
+
+def is_loaded(model_path, arch="U2NET", device=None):
+    device = torch.device(device) if device is not None else default_device()
+    return _key(model_path, arch, device) in _models
+
+
+def loaded_models():
+    """Describe every model currently held by the registry"""
+    with _lock:
+        return [entry.info() for entry in _models.values()]
+
+
+def unload_all():
+    with _lock:
+        _models.clear()
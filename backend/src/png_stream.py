@@ -0,0 +1,71 @@
+import struct
+import zlib
+
+import numpy as np
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# PNG row filter applied to every scanline: Sub (difference from the pixel
+# to the left) compresses photographic rows far better than None and is a
+# single vectorized subtraction
+_FILTER_SUB = 1
+
+
+def _write_chunk(fp, kind, data):
+    fp.write(struct.pack(">I", len(data)))
+    fp.write(kind)
+    fp.write(data)
+    fp.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)) & 0xFFFFFFFF))
+
+
+class PngStreamWriter:
+    """Encode an 8-bit RGBA PNG strip by strip into a binary file object
+
+    Only the current strip, its filtered copy and up to ``chunk_bytes`` of
+    compressed output are held in memory, so peak memory does not grow
+    with the image height.
+    """
+
+    def __init__(self, fp, size, compress_level=6, chunk_bytes=1 << 20):
+        self.fp = fp
+        self.width, self.height = size
+        self.chunk_bytes = chunk_bytes
+        self.rows_written = 0
+        self._compressor = zlib.compressobj(compress_level)
+        self._pending = bytearray()
+
+        fp.write(PNG_SIGNATURE)
+        # 8-bit depth, colour type 6 (RGBA), deflate, adaptive filtering, no interlace
+        _write_chunk(fp, b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 6, 0, 0, 0))
+
+    def write(self, strip):
+        """Append the rows of an RGBA PIL image (or (rows, width, 4) uint8 array)"""
+        rows = np.asarray(strip)
+        if rows.ndim != 3 or rows.shape[1:] != (self.width, 4) or rows.dtype != np.uint8:
+            raise ValueError(f"Expected RGBA rows of width {self.width}, got {rows.shape} {rows.dtype}")
+        if self.rows_written + rows.shape[0] > self.height:
+            raise ValueError("More rows written than the declared image height")
+
+        flat = rows.reshape(rows.shape[0], -1)
+        filtered = np.empty((rows.shape[0], flat.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = _FILTER_SUB
+        filtered[:, 1:5] = flat[:, :4]
+        # uint8 subtraction wraps modulo 256, which is exactly the Sub filter
+        np.subtract(flat[:, 4:], flat[:, :-4], out=filtered[:, 5:])
+
+        self._emit(self._compressor.compress(filtered))
+        self.rows_written += rows.shape[0]
+
+    def _emit(self, data):
+        self._pending += data
+        if len(self._pending) >= self.chunk_bytes:
+            _write_chunk(self.fp, b"IDAT", bytes(self._pending))
+            self._pending.clear()
+
+    def close(self):
+        if self.rows_written != self.height:
+            raise ValueError(f"Wrote {self.rows_written} of {self.height} rows")
+        self._pending += self._compressor.flush()
+        _write_chunk(self.fp, b"IDAT", bytes(self._pending))
+        self._pending.clear()
+        _write_chunk(self.fp, b"IEND", b"")
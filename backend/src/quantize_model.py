@@ -0,0 +1,141 @@
+"""Static post-training int8 quantization of U2NET / U2NETP for CPU serving
+
+Usage:
+    python src/quantize_model.py --checkpoint src/models/u2net.pth --calibration-dir samples/
+
+Observers are calibrated on images from ``--calibration-dir`` (use images
+that look like production traffic), then the network is converted with FX
+graph mode quantization and saved as a TorchScript file returning the
+fused d0 map, which the TorchScript backend serves
+(BG_INFERENCE_BACKEND=quantized).
+A report compares latency, file size and mask IoU against fp32.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from export_model import parity_inputs
+from inference_backends import EagerBackend, TorchScriptBackend
+from model_registry import ARCHITECTURES, build_network
+
+
+def quantize(net, calibration_batches, engine=None):
+    """Calibrate and convert an eval-mode, unfused, single-map network to int8
+
+    FX quantization fuses Conv+BN+ReLU itself, so the network must not
+    have been through fuse_rebnconv.
+    """
+    engine = engine or torch.backends.quantized.engine
+    torch.backends.quantized.engine = engine
+    example = torch.zeros(1, 3, 320, 320)
+
+    prepared = prepare_fx(net.eval(), get_default_qconfig_mapping(engine), (example,))
+    with torch.no_grad():
+        for batch in calibration_batches:
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+def save_quantized(quantized, output_path):
+    example = torch.zeros(1, 3, 320, 320)
+    with torch.no_grad():
+        scripted = torch.jit.freeze(torch.jit.trace(quantized, example))
+    scripted.save(str(output_path))
+    return output_path
+
+
+def mask_iou(a, b, threshold=0.5):
+    """IoU of two min/max-normalized masks binarised at ``threshold``"""
+    def binarize(pred):
+        pred = pred - pred.min()
+        return pred / max(float(pred.max()), 1e-8) > threshold
+
+    a, b = binarize(a), binarize(b)
+    union = np.logical_or(a, b).sum()
+    return float(np.logical_and(a, b).sum() / union) if union else 1.0
+
+
+def _median_ms(predict, batch, runs):
+    predict(batch)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        predict(batch)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def compare(fp32, int8, batches, runs=5):
+    """Latency and mask IoU of the int8 backend against fp32"""
+    ious = []
+    for batch in batches:
+        expected = fp32(batch)[:, 0].cpu().numpy()
+        actual = int8(batch)[:, 0].cpu().numpy()
+        ious.extend(mask_iou(e, a) for e, a in zip(expected, actual))
+
+    sample = batches[0][:1]
+    return {
+        "fp32_ms": _median_ms(fp32, sample, runs),
+        "int8_ms": _median_ms(int8, sample, runs),
+        "mean_iou": statistics.mean(ious),
+        "min_iou": min(ious),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Static int8 post-training quantization for U2NET")
+    parser.add_argument("--checkpoint", default="src/models/u2net.pth")
+    parser.add_argument("--arch", default="U2NET", choices=sorted(ARCHITECTURES))
+    parser.add_argument("--calibration-dir", help="Directory of representative sample images")
+    parser.add_argument("--calibration-count", type=int, default=32)
+    parser.add_argument("--eval-count", type=int, default=8, help="Images held out for the IoU report")
+    parser.add_argument("--synthetic", action="store_true", help="Calibrate on random noise (smoke tests only)")
+    parser.add_argument("--engine", default=None, help="Quantized engine, e.g. x86, fbgemm or qnnpack")
+    parser.add_argument("--output", default=None, help="Defaults to <checkpoint dir>/<stem>_int8.pt")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if not args.calibration_dir and not args.synthetic:
+        parser.error("--calibration-dir is required (or --synthetic for a smoke test)")
+
+    checkpoint = Path(args.checkpoint)
+    output_path = Path(args.output) if args.output else checkpoint.with_name(f"{checkpoint.stem}_int8.pt")
+
+    total = args.calibration_count + args.eval_count
+    batches = list(parity_inputs(None if args.synthetic else args.calibration_dir, count=total))
+    if len(batches) < 2:
+        parser.error("Need at least two sample images (one for calibration, one for evaluation)")
+    eval_count = min(args.eval_count, len(batches) // 2)
+    calibration, evaluation = batches[eval_count:], batches[:eval_count]
+    print(f"Calibrating on {len(calibration)} batches, evaluating on {len(evaluation)}")
+
+    net = build_network(str(checkpoint), arch=args.arch, device="cpu", output="d0", fuse=False)
+    quantized = quantize(net, calibration, engine=args.engine)
+    save_quantized(quantized, output_path)
+
+    fp32 = EagerBackend(build_network(str(checkpoint), arch=args.arch, device="cpu", output="d0"))
+    int8 = TorchScriptBackend(output_path, "cpu")
+    report = compare(fp32, int8, evaluation, runs=args.runs)
+
+    fp32_mb = checkpoint.stat().st_size / (1024 * 1024)
+    int8_mb = output_path.stat().st_size / (1024 * 1024)
+    print(f"Saved {output_path}")
+    print(f"size:    fp32 {fp32_mb:.1f} MB, int8 {int8_mb:.1f} MB ({fp32_mb / int8_mb:.1f}x smaller)")
+    print(f"latency: fp32 {report['fp32_ms']:.1f} ms, int8 {report['int8_ms']:.1f} ms "
+          f"({report['fp32_ms'] / report['int8_ms']:.2f}x)")
+    print(f"mask IoU vs fp32: mean {report['mean_iou']:.3f}, min {report['min_iou']:.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
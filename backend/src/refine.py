@@ -0,0 +1,85 @@
+import time
+
+import numpy as np
+from PIL import Image
+
+import config
+
+
+def _running_sums(x, radius):
+    """Sums over windows of 2r+1 rows (shrunk at the borders), and the window lengths"""
+    n = x.shape[0]
+    table = np.zeros((n + 1,) + x.shape[1:], dtype=np.float64)
+    np.cumsum(x, axis=0, dtype=np.float64, out=table[1:])
+    index = np.arange(n)
+    low, high = np.clip(index - radius, 0, n), np.clip(index + radius + 1, 0, n)
+    return table[high] - table[low], high - low
+
+
+def _box_mean(x, radius):
+    """Mean of ``x`` over a (2r+1)^2 window, shrunk at the borders, as two separable running sums"""
+    rows, row_counts = _running_sums(x, radius)
+    cols, col_counts = _running_sums(rows.T, radius)
+    return (cols.T / (row_counts[:, None] * col_counts[None, :])).astype(np.float32)
+
+
+class GuidedRefiner:
+    """Edge-aware alpha from the 320x320 mask, using the fast guided filter (He & Sun, 2015)
+
+    The linear coefficients ``alpha = a * luma + b`` are solved once at a
+    working resolution whose longest side is ``work_size``, then upsampled
+    bilinearly and applied to the full-resolution luminance. The full-size
+    cost is a few multiply-adds per pixel, and any row range can be
+    refined on its own, so the tiled path refines strip by strip.
+    """
+
+    def __init__(self, image, mask_small, radius=None, eps=None, work_size=None):
+        radius = config.REFINE_RADIUS if radius is None else radius
+        eps = config.REFINE_EPS if eps is None else eps
+        work_size = work_size or config.REFINE_WORK_SIZE
+
+        self.size = image.size
+        width, height = image.size
+        scale = min(1.0, work_size / max(width, height))
+        work = (max(1, round(width * scale)), max(1, round(height * scale)))
+
+        start = time.perf_counter()
+        # Downscale before converting so no full-size luminance copy is made
+        guide = image.resize(work, Image.BOX, reducing_gap=3.0).convert('L')
+        guide = np.asarray(guide, dtype=np.float32) / 255.0
+        mask = Image.fromarray(mask_small, 'L').resize(work, Image.BILINEAR)
+        mask = np.asarray(mask, dtype=np.float32) / 255.0
+
+        mean_i = _box_mean(guide, radius)
+        mean_p = _box_mean(mask, radius)
+        cov_ip = _box_mean(guide * mask, radius) - mean_i * mean_p
+        var_i = _box_mean(guide * guide, radius) - mean_i * mean_i
+        a = cov_ip / (var_i + eps)
+        b = mean_p - a * mean_i
+
+        self._a = Image.fromarray(_box_mean(a, radius), 'F')
+        self._b = Image.fromarray(_box_mean(b, radius), 'F')
+        self.solve_s = time.perf_counter() - start
+
+    def alpha(self, strip, top=0):
+        """Refined 'L' alpha for ``strip``, the rows of the image starting at ``top``"""
+        width, rows = strip.size
+        scale = self._a.height / self.size[1]
+        box = (0, top * scale, self._a.width, (top + rows) * scale)
+
+        luma = np.asarray(strip.convert('L'), dtype=np.float32)
+        alpha = np.asarray(self._a.resize((width, rows), Image.BILINEAR, box=box)) * luma
+        # 'F' coefficients expect the guide in [0, 1]; scale b to match luma in [0, 255]
+        alpha += np.asarray(self._b.resize((width, rows), Image.BILINEAR, box=box)) * np.float32(255.0)
+        np.clip(alpha, 0, 255, out=alpha)
+        return Image.fromarray(alpha.astype(np.uint8), 'L')
+
+    def full_alpha(self, image, rows=None):
+        """Refined alpha for the whole image, computed in strips to bound the float temporaries"""
+        rows = rows or config.TILE_ROWS
+        width, height = image.size
+        alpha = Image.new('L', image.size)
+        for top in range(0, height, rows):
+            bottom = min(top + rows, height)
+            alpha.paste(self.alpha(image.crop((0, top, width, bottom)), top), (0, top))
+        return alpha
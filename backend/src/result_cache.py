@@ -0,0 +1,191 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+import config
+
+
+# Bytes of decoded pixels hashed per strip by image_digest
+DIGEST_STRIP_BYTES = 4 * 1024 * 1024
+
+
+def image_digest(image, model_key=""):
+    """Hash the decoded pixels of a PIL image, so re-encoded copies of the same photo still match
+
+    The pixels are hashed a strip of rows at a time, so no contiguous copy
+    of the whole image is made; the digest equals that of ``tobytes()``.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    width, height = image.size
+    h.update(f"{model_key}|{image.mode}|{width}x{height}|".encode())
+    row_bytes = max(1, width * len(image.getbands()))
+    rows = max(1, DIGEST_STRIP_BYTES // row_bytes)
+    for top in range(0, height, rows):
+        h.update(image.crop((0, top, width, min(top + rows, height))).tobytes())
+    return h.hexdigest()
+
+
+def bytes_digest(data, model_key=""):
+    """Hash encoded image bytes, for inputs whose decoded pixels depend on the requested output size"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{model_key}|encoded|".encode())
+    h.update(data)
+    return h.hexdigest()
+
+
+def file_digest(path, model_key="", chunk_bytes=1 << 20):
+    """``bytes_digest`` of the contents of ``path``, read a chunk at a time"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{model_key}|encoded|".encode())
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_bytes), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU bounded by the total byte size of its values"""
+
+    def __init__(self, max_bytes, sizeof=len):
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= self._sizeof(old)
+            self._items[key] = value
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= self._sizeof(evicted)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class MaskCache:
+    """Predicted 320x320 uint8 masks keyed by image digest, in memory with an optional disk tier"""
+
+    def __init__(self, max_bytes, disk_dir=None, disk_max_bytes=0):
+        self.memory = LRUCache(max_bytes, sizeof=lambda mask: mask.nbytes)
+        self.disk_dir = Path(disk_dir) if disk_dir and disk_max_bytes > 0 else None
+        self.disk_max_bytes = disk_max_bytes
+        self._disk_lock = threading.Lock()
+        self.disk_hits = 0
+        self.disk_evictions = 0
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    def _disk_path(self, key):
+        return self.disk_dir / f"{key}.npy"
+
+    def get(self, key):
+        mask = self.memory.get(key)
+        if mask is not None or self.disk_dir is None:
+            return mask
+
+        path = self._disk_path(key)
+        try:
+            mask = np.load(path)
+            # Touch the file so disk eviction stays least-recently-used
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        with self._disk_lock:
+            self.disk_hits += 1
+        self.memory.put(key, mask)
+        return mask
+
+    def put(self, key, mask):
+        self.memory.put(key, mask)
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, mask)
+        os.replace(tmp_path, path)
+        self._evict_disk()
+
+    def _evict_disk(self):
+        with self._disk_lock:
+            entries = []
+            total = 0
+            for path in self.disk_dir.glob("*.npy"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.disk_max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                self.disk_evictions += 1
+
+    def stats(self):
+        stats = {"memory": self.memory.stats()}
+        if self.disk_dir is not None:
+            with self._disk_lock:
+                stats["disk"] = {
+                    "dir": str(self.disk_dir),
+                    "max_bytes": self.disk_max_bytes,
+                    "hits": self.disk_hits,
+                    "evictions": self.disk_evictions,
+                }
+        return stats
+
+
+_MB = 1024 * 1024
+
+# Process-wide caches; a budget of 0 disables the corresponding tier
+mask_cache = MaskCache(
+    int(config.MASK_CACHE_MB * _MB),
+    disk_dir=config.MASK_CACHE_DISK_DIR,
+    disk_max_bytes=int(config.MASK_CACHE_DISK_MB * _MB),
+)
+render_cache = LRUCache(int(config.RENDER_CACHE_MB * _MB))
+
+
+def cache_stats():
+    return {
+        "masks": mask_cache.stats(),
+        "renders": render_cache.stats(),
+    }
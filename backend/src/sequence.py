@@ -0,0 +1,215 @@
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+from PIL import Image, ImageSequence
+
+import config
+from background_removal import IMAGE_EXTENSIONS, check_input_size, hard_mask, inference_size, target_size
+from encoders import check_output, encode
+from image_ops import apply_alpha, fit_box, normalize_mask, preprocess, upsample_mask
+from model_registry import load_model
+from refine import GuidedRefiner
+from timing import StageTimer
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v"}
+
+# Side of the grayscale thumbnail frames are compared on
+SIGNATURE_SIZE = 64
+
+
+def _read_directory(path):
+    for frame_path in sorted(p for p in path.iterdir() if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS):
+        with Image.open(frame_path) as image:
+            yield image.convert('RGB')
+
+
+def _read_animation(path):
+    with Image.open(path) as image:
+        for frame in ImageSequence.Iterator(image):
+            yield frame.convert('RGB')
+
+
+def _read_video(path):
+    try:
+        import cv2
+    except ImportError as e:
+        raise RuntimeError("Video input requires the opencv-python package") from e
+
+    capture = cv2.VideoCapture(str(path))
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video: {path}")
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            yield Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    finally:
+        capture.release()
+
+
+def read_frames(source):
+    """Yield the frames of ``source`` as RGB images, one at a time
+
+    ``source`` is a directory of images (in name order), an animated
+    GIF/WebP/PNG, or a video file, which needs OpenCV.
+    """
+    path = Path(source)
+    if path.is_dir():
+        return _read_directory(path)
+    if path.suffix.lower() in VIDEO_EXTENSIONS:
+        return _read_video(path)
+    return _read_animation(path)
+
+
+def frame_signature(frame):
+    """Grayscale SIGNATURE_SIZE thumbnail of a frame as float32 in [0, 1]"""
+    small = frame.resize((SIGNATURE_SIZE, SIGNATURE_SIZE), reducing_gap=2.0).convert('L')
+    return np.asarray(small, dtype=np.float32) / 255.0
+
+
+def frame_difference(a, b):
+    """Mean absolute difference of two frame signatures, from 0 (identical) to 1"""
+    return float(np.abs(a - b).mean())
+
+
+def process_sequence(frames, handle_frame, model_path="models/u2net.pth", arch="U2NET", batch_size=8,
+                     diff_threshold=config.SEQUENCE_DIFF_THRESHOLD, smoothing=config.SEQUENCE_SMOOTHING,
+                     resolution="original", refine=False, fmt="png", output_kind="cutout", input_size=None,
+                     timer=None, on_progress=None):
+    """Remove backgrounds from the frames of a video or image sequence through one loaded model
+
+    ``frames`` yields PIL images in order (see ``read_frames``) and
+    ``handle_frame(index, data)`` receives each output encoded as ``fmt``,
+    in frame order. Frames that need a mask are preprocessed into batches
+    of up to ``batch_size`` forward passes. A frame whose signature differs
+    from the last inferred frame by less than ``diff_threshold`` reuses that
+    frame's mask instead; comparing against the last inferred frame rather
+    than the previous one keeps slow drift from accumulating. ``smoothing``
+    (0 to 1) blends each mask with the previous frame's at the network
+    resolution to suppress flicker. At most ``4 * batch_size`` decoded
+    frames are held at once. ``input_size`` selects the network input
+    bucket as for ``remove_background``; frames of different sizes in one
+    batch run as one forward pass per bucket.
+
+    Returns run statistics including frames/sec and per-stage timings.
+    """
+    check_output(fmt, output_kind)
+    check_input_size(input_size)
+    if not 0.0 <= smoothing < 1.0:
+        raise ValueError(f"smoothing must be in [0, 1), got {smoothing}")
+    timer = timer or StageTimer()
+    with timer.stage("model_load"):
+        model = load_model(model_path, arch=arch)
+
+    # Frames waiting for their batch: (index, frame, position of their mask in the batch)
+    pending = []
+    batch_frames = []
+    key_signature = None
+    key_mask = None
+    previous = None
+    stats = {"frames": 0, "inferred": 0, "reused": 0, "batches": 0}
+
+    def infer(batch):
+        # Frames of a sequence nearly always share one size, so one group
+        groups = {}
+        for i, frame in enumerate(batch):
+            size = inference_size(frame.size, input_size, model.fixed_size)
+            box = fit_box(frame.size, size) if config.INFERENCE_LETTERBOX else None
+            groups.setdefault((size, box), []).append(i)
+        masks = [None] * len(batch)
+        for (size, box), positions in groups.items():
+            with timer.stage("preprocess"):
+                tensor = torch.empty((len(positions), 3, size, size))
+                for row, i in enumerate(positions):
+                    # preprocess() returns a per-thread buffer, so copy each frame out
+                    tensor[row] = preprocess(batch[i], size=size, box=box)[0]
+            with timer.stage("inference"):
+                preds = model.predict(tensor.to(model.device))[:, 0].cpu().numpy()
+            stats["batches"] += 1
+            if box is not None:
+                left, top, right, bottom = box
+                preds = preds[:, top:bottom, left:right]
+            for row, i in enumerate(positions):
+                masks[i] = normalize_mask(preds[row])
+        return masks
+
+    def render(frame, mask_small):
+        output_size = target_size(resolution, frame.size)
+        if frame.size != output_size and (output_kind == "cutout" or refine):
+            with timer.stage("resize"):
+                frame = frame.resize(output_size, Image.LANCZOS)
+        if refine:
+            with timer.stage("refine"):
+                mask = GuidedRefiner(frame, mask_small).full_alpha(frame)
+        else:
+            with timer.stage("upsample"):
+                mask = upsample_mask(mask_small, output_size)
+        with timer.stage("composite"):
+            if output_kind == "matte":
+                return mask
+            if output_kind == "mask":
+                return hard_mask(mask)
+            return apply_alpha(frame, mask)
+
+    def flush():
+        nonlocal key_mask, previous
+        masks = infer(batch_frames) if batch_frames else []
+        for index, frame, slot in pending:
+            mask_small = masks[slot] if slot is not None else key_mask
+            if smoothing:
+                current = mask_small.astype(np.float32)
+                if previous is not None and previous.shape == current.shape:
+                    current = current * (1.0 - smoothing) + previous * smoothing
+                previous = current
+                mask_small = current.astype(np.uint8)
+            result = render(frame, mask_small)
+            with timer.stage("encode"):
+                data = encode(result, fmt)
+            with timer.stage("write"):
+                handle_frame(index, data)
+            stats["frames"] += 1
+        if masks:
+            key_mask = masks[-1]
+        pending.clear()
+        batch_frames.clear()
+        if on_progress is not None:
+            on_progress(stats["frames"], time.perf_counter() - start)
+
+    start = time.perf_counter()
+    frames = iter(frames)
+    index = 0
+    while True:
+        with timer.stage("decode"):
+            frame = next(frames, None)
+        if frame is None:
+            break
+        with timer.stage("hash"):
+            signature = frame_signature(frame)
+        if key_signature is not None and frame_difference(signature, key_signature) < diff_threshold:
+            # Reuse the newest keyframe's mask, queued in this batch or already computed
+            slot = len(batch_frames) - 1 if batch_frames else None
+            stats["reused"] += 1
+        else:
+            key_signature = signature
+            slot = len(batch_frames)
+            batch_frames.append(frame)
+            stats["inferred"] += 1
+        pending.append((index, frame, slot))
+        index += 1
+        if len(batch_frames) >= batch_size or len(pending) >= 4 * batch_size:
+            flush()
+    flush()
+
+    seconds = time.perf_counter() - start
+    stats["seconds"] = round(seconds, 3)
+    stats["frames_per_sec"] = round(stats["frames"] / seconds, 2) if seconds > 0 else 0.0
+    stats["timings"] = timer.as_dict()
+    logger.info("Processed %d frames (%d inferred, %d reused) at %.2f frames/sec",
+                stats["frames"], stats["inferred"], stats["reused"], stats["frames_per_sec"])
+    return stats
@@ -0,0 +1,85 @@
+"""Command-line background removal for videos and image sequences
+
+Usage:
+    python src/sequence_remove.py INPUT OUTPUT_DIR [--diff-threshold 0.005] [--smoothing 0.5]
+
+INPUT is a directory of frames (processed in name order), an animated
+GIF/WebP/PNG, or a video file (needs opencv-python). Each frame is written
+to OUTPUT_DIR as ``frame_<index>.<format>``, by default a PNG with an alpha
+channel. Frames that barely differ from the last inferred frame reuse its
+mask instead of running the model again.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config
+from background_removal import RESOLUTIONS
+from encoders import OUTPUT_FORMATS, OUTPUT_KINDS
+from model_registry import ARCHITECTURES
+from sequence import process_sequence, read_frames
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Remove backgrounds from every frame of a video or image sequence")
+    parser.add_argument("input")
+    parser.add_argument("output_dir")
+    parser.add_argument("--resolution", default="original", choices=["original", *RESOLUTIONS])
+    parser.add_argument("--model", default="src/models/u2net.pth", help="Path to the model checkpoint")
+    parser.add_argument("--arch", default="U2NET", choices=sorted(ARCHITECTURES))
+    parser.add_argument("--batch-size", type=int, default=config.BATCH_MAX_SIZE)
+    parser.add_argument("--diff-threshold", type=float, default=config.SEQUENCE_DIFF_THRESHOLD,
+                        help="Reuse the last mask below this mean frame difference (0-1); 0 infers every frame")
+    parser.add_argument("--smoothing", type=float, default=config.SEQUENCE_SMOOTHING,
+                        help="Weight of the previous mask when blending masks over time (0 disables)")
+    parser.add_argument("--inference-size", default=None, choices=["auto", *map(str, config.INFERENCE_SIZES)],
+                        help="Network input side (default BG_INFERENCE_SIZE)")
+    parser.add_argument("--refine", action="store_true", help="Refine mask edges with the guided filter")
+    parser.add_argument("--format", default="png", choices=list(OUTPUT_FORMATS))
+    parser.add_argument("--output", default="cutout", choices=OUTPUT_KINDS,
+                        help="Cut-out frames, hard 0/255 masks or soft alpha mattes")
+    args = parser.parse_args(argv)
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    def save(index, data):
+        with open(output_dir / f"frame_{index:06d}.{args.format}", "wb") as f:
+            f.write(data)
+
+    last_report = [time.perf_counter()]
+
+    def progress(frames, elapsed):
+        now = time.perf_counter()
+        if now - last_report[0] >= 5:
+            last_report[0] = now
+            print(f"{frames} frames done, {frames / elapsed:.2f} frames/sec")
+
+    stats = process_sequence(
+        read_frames(args.input),
+        save,
+        model_path=args.model,
+        arch=args.arch,
+        batch_size=args.batch_size,
+        diff_threshold=args.diff_threshold,
+        smoothing=args.smoothing,
+        resolution=args.resolution,
+        refine=args.refine,
+        fmt=args.format,
+        output_kind=args.output,
+        input_size=args.inference_size,
+        on_progress=progress,
+    )
+
+    print(f"Processed {stats['frames']} frames in {stats['seconds']}s ({stats['frames_per_sec']} frames/sec): "
+          f"{stats['inferred']} inferred in {stats['batches']} batches, {stats['reused']} reused a mask")
+    print("Stage seconds: " + ", ".join(f"{stage} {seconds}" for stage, seconds in stats["timings"].items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
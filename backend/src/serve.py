@@ -0,0 +1,156 @@
+"""Prefork API server: load the models once, then fork workers that share them
+
+Usage:
+    python src/serve.py [--workers 4] [--host 0.0.0.0] [--port 8000] [--threads 2]
+
+``uvicorn main:app --workers N`` starts every worker from scratch, so each
+holds its own copy of the weights. Here the parent loads and warms every
+installed model tier first and then forks the workers, which inherit the
+weight pages copy-on-write and never write to them: the weights are
+resident once however many workers run, and only activations are per
+worker. Each worker limits torch to its share of the cores
+(BG_TORCH_THREADS, by default the cores divided by the workers) so they do
+not oversubscribe the CPU. The parent logs the RSS, PSS and shared memory
+of every worker every BG_MEMORY_REPORT_S seconds and restarts workers that
+exit unexpectedly. Linux only (fork and /proc).
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import torch
+import uvicorn
+
+import config
+import main as api
+import model_registry
+import tiers
+from memory_usage import process_memory
+
+logger = logging.getLogger("background_remover.serve")
+
+
+def preload_models():
+    """Load and warm every installed tier so forked workers find them in the registry"""
+    for tier, model_path in api.MODEL_PATHS.items():
+        if model_path.exists():
+            model_registry.load_model(str(model_path), arch=tiers.TIER_ARCHS[tier])
+    return model_registry.loaded_models()
+
+
+def torch_threads(workers):
+    return config.TORCH_THREADS or max(1, (os.cpu_count() or 1) // workers)
+
+
+def _serve(sock, threads):
+    torch.set_num_threads(threads)
+    logger.info("Worker %d serving with %d torch threads", os.getpid(), threads)
+    # log_config=None keeps the logging set up by main
+    uvicorn.Server(uvicorn.Config(api.app, log_config=None)).run(sockets=[sock])
+
+
+def spawn_worker(sock, threads):
+    pid = os.fork()
+    if pid:
+        return pid
+    code = 0
+    try:
+        # Own process group, so Ctrl-C reaches only the parent, which stops workers with SIGTERM
+        os.setpgid(0, 0)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        _serve(sock, threads)
+    except BaseException:
+        logger.exception("Worker %d crashed", os.getpid())
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def report_memory(workers):
+    parent = process_memory()
+    usage = {}
+    for pid in sorted(workers):
+        try:
+            usage[pid] = process_memory(pid)
+        except OSError:
+            continue
+    for pid, memory in usage.items():
+        logger.info("Worker %d: RSS %.0f MB, PSS %.0f MB, shared %.0f MB",
+                    pid, memory["rss_mb"], memory["pss_mb"], memory["shared_mb"])
+    logger.info("Total PSS %.0f MB for the parent and %d workers (RSS sum %.0f MB)",
+                parent["pss_mb"] + sum(m["pss_mb"] for m in usage.values()), len(usage),
+                parent["rss_mb"] + sum(m["rss_mb"] for m in usage.values()))
+    return usage
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the API from workers forked after loading the models")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=config.SERVE_WORKERS)
+    parser.add_argument("--threads", type=int, default=None, help="torch threads per worker")
+    args = parser.parse_args(argv)
+
+    if not hasattr(os, "fork"):
+        parser.error("Prefork serving needs os.fork; run uvicorn directly on this platform")
+    threads = args.threads or torch_threads(args.workers)
+
+    start = time.perf_counter()
+    for model in preload_models():
+        logger.info("Preloaded %s (%s, %.1f MB)", model["arch"], model["backend"], model["resident_size_mb"])
+    logger.info("Models ready in %.2fs, forking %d workers", time.perf_counter() - start, args.workers)
+
+    sock = socket.socket(socket.AF_INET6 if ":" in args.host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    # Objects that exist now are never collected in the workers, so the
+    # collector does not dirty (and copy) the pages holding them
+    gc.collect()
+    gc.freeze()
+
+    workers = {spawn_worker(sock, threads) for _ in range(args.workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    next_report = time.monotonic() + min(10, config.MEMORY_REPORT_S)
+    while workers:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            workers.discard(pid)
+            if not stopping:
+                logger.warning("Worker %d exited with status %d, restarting", pid, os.waitstatus_to_exitcode(status))
+                time.sleep(1)
+                workers.add(spawn_worker(sock, threads))
+            continue
+        if config.MEMORY_REPORT_S > 0 and time.monotonic() >= next_report:
+            report_memory(workers)
+            next_report = time.monotonic() + config.MEMORY_REPORT_S
+        time.sleep(0.5)
+    sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
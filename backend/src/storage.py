@@ -0,0 +1,133 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+SHARD_CHARS = 2
+
+
+def shard_of(filename):
+    """Two hex characters spreading files over 256 subdirectories"""
+    return hashlib.blake2b(filename.encode(), digest_size=4).hexdigest()[:SHARD_CHARS]
+
+
+def _check_name(filename):
+    if not filename or Path(filename).name != filename or filename in (".", ".."):
+        raise ValueError(f"Invalid filename: {filename!r}")
+
+
+def sharded_path(root, filename):
+    """Where ``filename`` is written under ``root``; creates its shard directory"""
+    _check_name(filename)
+    directory = Path(root) / shard_of(filename)
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / filename
+
+
+def resolve(root, filename):
+    """Existing path of ``filename`` under ``root`` (sharded, or flat from before sharding), or None"""
+    _check_name(filename)
+    for path in (Path(root) / shard_of(filename) / filename, Path(root) / filename):
+        if path.is_file():
+            return path
+    return None
+
+
+def _scan(root):
+    """(path, size, mtime) of every file under ``root``, flat or one shard level deep"""
+    entries = []
+    pending = [(root, True)]
+    while pending:
+        directory, descend = pending.pop()
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if descend:
+                        pending.append((entry.path, False))
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    entries.append((entry.path, stat.st_size, stat.st_mtime))
+    return entries
+
+
+class Janitor:
+    """Deletes expired files and enforces a byte quota on storage directories
+
+    ``policies`` maps a directory to ``(ttl_s, max_bytes)``; a max_bytes of
+    0 disables the quota. Files older than the TTL are removed, then the
+    oldest files go until the directory fits its quota. Files younger than
+    ``grace_s`` are never evicted for quota, so in-flight writes survive.
+    ``sweep`` is blocking; the server runs it off the event loop.
+    """
+
+    def __init__(self, policies, grace_s=60):
+        self.policies = {Path(root): policy for root, policy in policies.items()}
+        self.grace_s = grace_s
+        self._lock = threading.Lock()
+        self._stored = {str(root): {"files": 0, "bytes": 0} for root in self.policies}
+        self._evicted = {"expired": 0, "quota": 0, "bytes": 0, "errors": 0}
+        self.sweeps = 0
+        self.last_sweep_s = 0.0
+        self.last_sweep_at = None
+
+    def _remove(self, path, size, reason):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            logger.warning("Janitor could not remove %s: %s", path, e)
+            self._evicted["errors"] += 1
+            return False
+        self._evicted[reason] += 1
+        self._evicted["bytes"] += size
+        return True
+
+    def sweep_dir(self, root, ttl_s, max_bytes, now=None):
+        now = time.time() if now is None else now
+        if not root.exists():
+            return {"files": 0, "bytes": 0}
+
+        kept = []
+        for path, size, mtime in _scan(root):
+            if ttl_s > 0 and now - mtime > ttl_s:
+                if self._remove(path, size, "expired"):
+                    continue
+            kept.append((path, size, mtime))
+
+        total = sum(size for _, size, _ in kept)
+        if max_bytes > 0 and total > max_bytes:
+            kept.sort(key=lambda entry: entry[2])
+            survivors = []
+            for path, size, mtime in kept:
+                if total > max_bytes and now - mtime > self.grace_s and self._remove(path, size, "quota"):
+                    total -= size
+                else:
+                    survivors.append((path, size, mtime))
+            kept = survivors
+        return {"files": len(kept), "bytes": total}
+
+    def sweep(self):
+        """Apply every policy once and return what this sweep evicted"""
+        start = time.perf_counter()
+        with self._lock:
+            before = dict(self._evicted)
+            for root, (ttl_s, max_bytes) in self.policies.items():
+                self._stored[str(root)] = self.sweep_dir(root, ttl_s, max_bytes)
+            self.sweeps += 1
+            self.last_sweep_s = time.perf_counter() - start
+            self.last_sweep_at = time.time()
+            return {key: self._evicted[key] - before[key] for key in before}
+
+    def stats(self):
+        return {
+            "stored": {root: dict(stored) for root, stored in self._stored.items()},
+            "evicted": dict(self._evicted),
+            "sweeps": self.sweeps,
+            "last_sweep_s": round(self.last_sweep_s, 4),
+            "last_sweep_at": self.last_sweep_at,
+        }
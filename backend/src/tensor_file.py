@@ -0,0 +1,81 @@
+import json
+import struct
+
+import numpy as np
+import torch
+
+# Layout of the safetensors format, so files interoperate with that package:
+# an 8-byte little-endian header length, a JSON header mapping each name to
+# its dtype, shape and [begin, end) byte range, then the raw tensor bytes.
+DTYPES = {
+    "F64": (torch.float64, np.float64),
+    "F32": (torch.float32, np.float32),
+    "F16": (torch.float16, np.float16),
+    "I64": (torch.int64, np.int64),
+    "I32": (torch.int32, np.int32),
+    "U8": (torch.uint8, np.uint8),
+    "BOOL": (torch.bool, np.bool_),
+}
+_CODES = {torch_dtype: code for code, (torch_dtype, _) in DTYPES.items()}
+
+
+def save_file(tensors, path, metadata=None):
+    """Write a ``{name: tensor}`` mapping as one flat, memory-mappable file
+
+    Tensors are laid out by decreasing element size, so every tensor starts
+    at an offset aligned for its dtype once the header is padded to 8 bytes.
+    ``metadata`` is a ``{str: str}`` mapping stored in the header.
+    """
+    arrays = {}
+    for name, tensor in tensors.items():
+        if tensor.dtype not in _CODES:
+            raise ValueError(f"Unsupported dtype for {name}: {tensor.dtype}")
+        arrays[name] = tensor.detach().cpu().contiguous().numpy()
+
+    header = {"__metadata__": dict(metadata or {})}
+    offset = 0
+    order = sorted(arrays, key=lambda name: (-arrays[name].itemsize, name))
+    for name in order:
+        array = arrays[name]
+        header[name] = {
+            "dtype": _CODES[tensors[name].dtype],
+            "shape": list(array.shape),
+            "data_offsets": [offset, offset + array.nbytes],
+        }
+        offset += array.nbytes
+
+    encoded = json.dumps(header, separators=(",", ":")).encode()
+    encoded += b" " * (-len(encoded) % 8)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(encoded)))
+        f.write(encoded)
+        for name in order:
+            f.write(arrays[name].tobytes())
+    return path
+
+
+def read_header(path):
+    """Return the tensor entries, metadata and data start offset of a tensor file"""
+    with open(path, "rb") as f:
+        (length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length))
+    metadata = header.pop("__metadata__", {})
+    return header, metadata, 8 + length
+
+
+def load_file(path):
+    """Map a tensor file and return ``({name: tensor}, metadata)`` without copying
+
+    The file is mapped copy-on-write: tensors are views of the mapping, so
+    pages are read from the page cache on first touch and shared by every
+    process mapping the same file until one of them writes to a tensor.
+    """
+    header, metadata, start = read_header(path)
+    mapped = np.memmap(path, dtype=np.uint8, mode="c")
+    tensors = {}
+    for name, entry in header.items():
+        begin, end = entry["data_offsets"]
+        _, np_dtype = DTYPES[entry["dtype"]]
+        array = mapped[start + begin:start + end].view(np_dtype).reshape(entry["shape"])
+        tensors[name] = torch.from_numpy(array)
+    return tensors, metadata
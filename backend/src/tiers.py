@@ -0,0 +1,59 @@
+import threading
+
+import config
+
+# Model tiers: the full U2NET for final exports, U2NETP for previews and overload
+TIER_ARCHS = {
+    "full": "U2NET",
+    "fast": "U2NETP",
+}
+
+QUALITY_OPTIONS = ("auto", *TIER_ARCHS)
+
+
+def choose_tier(quality, image_size=None, in_flight=0, fast_available=True):
+    """Pick the tier serving a request
+
+    "full" and "fast" are honoured as asked (fast falls back to full when
+    the small model is not installed). "auto" uses the fast tier for
+    thumbnail-sized images and whenever the number of in-flight requests
+    reaches BG_FAST_TIER_LOAD, and the full model otherwise.
+    """
+    if quality not in QUALITY_OPTIONS:
+        raise ValueError(f"Invalid quality: {quality}. Allowed: {', '.join(QUALITY_OPTIONS)}")
+    if quality == "full" or not fast_available:
+        return "full"
+    if quality == "fast":
+        return "fast"
+
+    if image_size is not None and image_size[0] * image_size[1] <= config.FAST_TIER_MAX_PIXELS:
+        return "fast"
+    if in_flight >= config.FAST_TIER_LOAD:
+        return "fast"
+    return "full"
+
+
+class TierLatency:
+    """Request count and latency per tier"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {tier: {"requests": 0, "total_s": 0.0, "max_s": 0.0} for tier in TIER_ARCHS}
+
+    def record(self, tier, seconds):
+        with self._lock:
+            stats = self._stats[tier]
+            stats["requests"] += 1
+            stats["total_s"] += seconds
+            stats["max_s"] = max(stats["max_s"], seconds)
+
+    def stats(self):
+        with self._lock:
+            return {
+                tier: {
+                    "requests": stats["requests"],
+                    "mean_s": round(stats["total_s"] / stats["requests"], 4) if stats["requests"] else 0.0,
+                    "max_s": round(stats["max_s"], 4),
+                }
+                for tier, stats in self._stats.items()
+            }
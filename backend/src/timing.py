@@ -0,0 +1,23 @@
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """Records wall time per pipeline stage and notifies an optional listener on entry"""
+
+    def __init__(self, listener=None):
+        self.listener = listener
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        if self.listener is not None:
+            self.listener(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def as_dict(self, digits=4):
+        return {name: round(seconds, digits) for name, seconds in self.timings.items()}
@@ -1,6 +1,7 @@
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.nn.utils.fusion import fuse_conv_bn_eval
 
 class REBNCONV(nn.Module):
     def __init__(self,in_ch=3,out_ch=3,dirate=1):
@@ -17,6 +18,23 @@ class REBNCONV(nn.Module):
 
         return xout
 
+    def fuse(self):
+        """Fold bn_s1 into conv_s1 for eval-mode inference; the block can no longer be trained"""
+        if isinstance(self.bn_s1,nn.BatchNorm2d):
+            self.conv_s1 = fuse_conv_bn_eval(self.conv_s1,self.bn_s1)
+            self.bn_s1 = nn.Identity()
+        return self
+
+## fold every REBNCONV BatchNorm into its convolution (eval-mode inference only)
+def fuse_rebnconv(net):
+
+    net.eval()
+    for module in net.modules():
+        if isinstance(module,REBNCONV):
+            module.fuse()
+
+    return net
+
 ## upsample tensor 'src' to have the same spatial size with tensor 'tar'
 def _upsample_like(src,tar):
 
@@ -353,6 +371,16 @@ class U2NET(nn.Module):
 
         self.outconv = nn.Conv2d(6*out_ch,out_ch,1)
 
+        # None returns all seven maps (training); "d0" (served) or "d1" returns only that map
+        self.inference_output = None
+
+    def set_inference_output(self,output):
+        """Select "d0" (fused) or "d1" to return a single map, or None for all seven"""
+        if output not in (None,"d0","d1"):
+            raise ValueError(f"Unsupported inference output: {output}")
+        self.inference_output = output
+        return self
+
     def forward(self,x):
 
         hx = x
@@ -400,6 +428,10 @@ class U2NET(nn.Module):
         #side output
         d1 = self.side1(hx1d)
 
+        if self.inference_output == "d1":
+            # d1 alone needs none of the other side branches or their upsampling
+            return F.sigmoid(d1)
+
         d2 = self.side2(hx2d)
         d2 = _upsample_like(d2,d1)
 
@@ -417,6 +449,9 @@ class U2NET(nn.Module):
 
         d0 = self.outconv(torch.cat((d1,d2,d3,d4,d5,d6),1))
 
+        if self.inference_output == "d0":
+            return F.sigmoid(d0)
+
         return F.sigmoid(d0), F.sigmoid(d1), F.sigmoid(d2), F.sigmoid(d3), F.sigmoid(d4), F.sigmoid(d5), F.sigmoid(d6)
 
 ### U^2-Net small ###
@@ -458,6 +493,16 @@ class U2NETP(nn.Module):
 
         self.outconv = nn.Conv2d(6*out_ch,out_ch,1)
 
+        # None returns all seven maps (training); "d0" (served) or "d1" returns only that map
+        self.inference_output = None
+
+    def set_inference_output(self,output):
+        """Select "d0" (fused) or "d1" to return a single map, or None for all seven"""
+        if output not in (None,"d0","d1"):
+            raise ValueError(f"Unsupported inference output: {output}")
+        self.inference_output = output
+        return self
+
     def forward(self,x):
 
         hx = x
@@ -505,6 +550,10 @@ class U2NETP(nn.Module):
         #side output
         d1 = self.side1(hx1d)
 
+        if self.inference_output == "d1":
+            # d1 alone needs none of the other side branches or their upsampling
+            return F.sigmoid(d1)
+
         d2 = self.side2(hx2d)
         d2 = _upsample_like(d2,d1)
 
@@ -522,4 +571,7 @@ class U2NETP(nn.Module):
 
         d0 = self.outconv(torch.cat((d1,d2,d3,d4,d5,d6),1))
 
+        if self.inference_output == "d0":
+            return F.sigmoid(d0)
+
         return F.sigmoid(d0), F.sigmoid(d1), F.sigmoid(d2), F.sigmoid(d3), F.sigmoid(d4), F.sigmoid(d5), F.sigmoid(d6)
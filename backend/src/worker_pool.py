@@ -0,0 +1,81 @@
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class PoolSaturated(Exception):
+    """Raised when every worker is busy and the admission queue is full"""
+
+
+class WorkerPool:
+    """Runs blocking pipeline calls off the event loop with bounded admission
+
+    At most ``max_workers`` calls run at once and at most ``max_queue`` more
+    wait for a worker; anything beyond that is rejected immediately with
+    PoolSaturated so the API can answer 503 instead of piling up work.
+    """
+
+    def __init__(self, kind="thread", max_workers=4, max_queue=16, initializer=None, initargs=()):
+        if kind == "thread":
+            self._executor = ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix="bg-worker",
+                initializer=initializer,
+                initargs=initargs,
+            )
+        elif kind == "process":
+            self._executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=initializer,
+                initargs=initargs,
+            )
+        else:
+            raise ValueError(f"Unsupported worker pool kind: {kind}")
+
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._capacity = max_workers + max_queue
+        self._slots = threading.BoundedSemaphore(self._capacity)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rejected = 0
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise PoolSaturated(f"{self._capacity} requests already in flight")
+
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """Submit a call and await its result without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def _release(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queued": max(0, self._in_flight - self.max_workers),
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+
+@pytest.fixture(scope="session")
+def client(tmp_path_factory):
+    """API client without the startup hook, so no model is loaded; requests must fail validation first"""
+    from fastapi.testclient import TestClient
+
+    # main creates its upload, output and model directories relative to the working directory
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("api"))
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+    return TestClient(main.app)
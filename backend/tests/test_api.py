@@ -0,0 +1,80 @@
+import io
+
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+
+def _png():
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), (200, 50, 50)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_unknown_resolution_is_rejected(client):
+    for response_mode in ("file", "stream"):
+        response = client.post(
+            "/api/remove-background",
+            files={"file": ("photo.png", _png(), "image/png")},
+            data={"resolution": "8k", "response_mode": response_mode},
+        )
+        assert response.status_code == 400
+        assert "Invalid resolution: 8k" in response.json()["detail"]
+
+
+def test_unknown_resolution_is_rejected_for_jobs(client):
+    response = client.post(
+        "/api/jobs",
+        files={"file": ("photo.png", _png(), "image/png")},
+        data={"resolution": "8k"},
+    )
+    assert response.status_code == 400
+
+
+def test_undecodable_upload_is_rejected_for_jobs(client):
+    for quality in ("auto", "full"):
+        response = client.post(
+            "/api/jobs",
+            files={"file": ("photo.png", b"not an image", "image/png")},
+            data={"quality": quality},
+        )
+        assert response.status_code == 400
+        assert "Invalid image" in response.json()["detail"]
+
+
+def test_undecodable_upload_is_rejected_for_renditions(client):
+    for quality in ("auto", "full"):
+        response = client.post(
+            "/api/remove-background/renditions",
+            files={"file": ("photo.png", b"not an image", "image/png")},
+            data={"quality": quality},
+        )
+        assert response.status_code == 400
+        assert "Invalid image" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("route", ["/api/remove-background", "/api/remove-background/renditions", "/api/jobs"])
+def test_quality_defaults_to_full_model(client, monkeypatch, route):
+    import main
+
+    def choose_tier(quality, source):
+        raise HTTPException(status_code=418, detail=quality)
+
+    monkeypatch.setattr(main, "_choose_tier", choose_tier)
+    # Stream mode, so the upload is not saved under the working directory
+    response = client.post(route, files={"file": ("photo.png", _png(), "image/png")},
+                           data={"response_mode": "stream"})
+    assert response.status_code == 418
+    assert response.json()["detail"] == "full"
+
+
+def test_batch_quality_defaults_to_full_model(client, monkeypatch):
+    import main
+
+    def choose_batch_tier(quality, items):
+        raise HTTPException(status_code=418, detail=quality)
+
+    monkeypatch.setattr(main, "_choose_batch_tier", choose_batch_tier)
+    response = client.post("/api/remove-background/batch", files={"files": ("photo.png", _png(), "image/png")})
+    assert response.status_code == 418
+    assert response.json()["detail"] == "full"
@@ -0,0 +1,97 @@
+import io
+import zipfile
+
+import pytest
+
+from bulk import UploadTooLarge, expand_uploads
+
+
+def _zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def test_expand_uploads_unpacks_zip_images():
+    archive = _zip({"a/one.png": b"1", "notes.txt": b"skip", "two.jpg": b"2"})
+    items = expand_uploads([("three.webp", b"3"), ("photos.zip", archive)])
+    assert items == [("three.webp", b"3"), ("a/one.png", b"1"), ("two.jpg", b"2")]
+
+
+def test_expand_uploads_limits_image_count_before_reading(monkeypatch):
+    archive = _zip({f"{i}.png": b"x" for i in range(5)})
+    monkeypatch.setattr(zipfile.ZipFile, "read", lambda *args: pytest.fail("member read before the limit check"))
+    with pytest.raises(UploadTooLarge, match="Too many images: 6"):
+        expand_uploads([("photos.zip", archive), ("one.png", b"1")], max_images=5)
+
+
+def test_expand_uploads_limits_uncompressed_size_before_reading(monkeypatch):
+    # 64 MB of zeros deflates to about 64 KB
+    archive = _zip({"bomb.png": bytes(64 * 1024 * 1024)})
+    assert len(archive) < 1024 * 1024
+    monkeypatch.setattr(zipfile.ZipFile, "read", lambda *args: pytest.fail("member read before the limit check"))
+    with pytest.raises(UploadTooLarge, match="unpack to 64 MB"):
+        expand_uploads([("photos.zip", archive)], max_unzipped_bytes=16 * 1024 * 1024)
+
+
+def test_expand_uploads_rejects_invalid_archives():
+    with pytest.raises(ValueError, match="Invalid zip archive"):
+        expand_uploads([("photos.zip", b"not a zip")])
+    with pytest.raises(ValueError, match="Invalid file type"):
+        expand_uploads([("notes.txt", b"text")])
+
+
+def test_batch_zip_lists_failed_inputs(tmp_path):
+    import torch
+    from PIL import Image
+
+    from bulk import remove_backgrounds_to_zip
+    from model_registry import ARCHITECTURES
+
+    torch.manual_seed(0)
+    model_path = tmp_path / "u2netp.pth"
+    torch.save(ARCHITECTURES["U2NETP"](3, 1).state_dict(), model_path)
+    image = io.BytesIO()
+    Image.new("RGB", (16, 12), (200, 50, 50)).save(image, format="PNG")
+
+    items = [("good.png", image.getvalue()), ("bad.png", b"not an image")]
+    zip_bytes, stats = remove_backgrounds_to_zip(items, model_path=str(model_path), arch="U2NETP", workers=1,
+                                                 input_size="192")
+    assert (stats["processed"], stats["failed"]) == (1, 1)
+    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as archive:
+        assert sorted(archive.namelist()) == ["errors.txt", "good_output.png"]
+        errors = archive.read("errors.txt").decode()
+    assert errors.startswith("bad.png: UnidentifiedImageError")
+
+
+def test_output_names_keep_output_kinds_apart():
+    from bulk import output_name
+
+    assert output_name("a/photo.jpg", "png") == "a/photo_output.png"
+    assert output_name("a/photo.jpg", "png", "mask") == "a/photo_mask_output.png"
+    assert output_name("../photo.jpg", "webp", "matte") == "photo_matte_output.webp"
+
+
+def test_bulk_cli_resume_skips_only_the_requested_output_kind(tmp_path, monkeypatch):
+    import bulk_remove
+
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    input_dir.mkdir()
+    output_dir.mkdir()
+    for name in ("one.png", "two.png"):
+        (input_dir / name).write_bytes(b"")
+    (output_dir / "one_output.png").write_bytes(b"")
+    (output_dir / "two_mask_output.png").write_bytes(b"")
+
+    queued = {}
+
+    def process_many(todo, handle_result, output_kind="cutout", **kwargs):
+        queued[output_kind] = [name for name, _ in todo]
+        return {"processed": len(todo), "failed": 0, "errors": [], "seconds": 0.0, "images_per_sec": 0.0}
+
+    monkeypatch.setattr(bulk_remove, "process_many", process_many)
+    for kind in ("cutout", "mask", "matte"):
+        assert bulk_remove.main([str(input_dir), str(output_dir), "--output", kind]) == 0
+    assert queued == {"cutout": ["two.png"], "mask": ["one.png"], "matte": ["one.png", "two.png"]}
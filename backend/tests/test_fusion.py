@@ -0,0 +1,80 @@
+import copy
+
+import pytest
+import torch
+
+from convert_checkpoint import convert
+from model_registry import ARCHITECTURES, build_network
+from u2net_model import REBNCONV, fuse_rebnconv
+
+
+def _randomize_batchnorm(net, seed=0):
+    """Running statistics and affine parameters far from the identity a fresh BatchNorm has"""
+    generator = torch.Generator().manual_seed(seed)
+    for module in net.modules():
+        if isinstance(module, torch.nn.BatchNorm2d):
+            n = module.num_features
+            module.running_mean.copy_(torch.randn(n, generator=generator) * 0.1)
+            module.running_var.copy_(torch.rand(n, generator=generator) + 0.5)
+            module.weight.data.copy_(torch.rand(n, generator=generator) + 0.5)
+            module.bias.data.copy_(torch.randn(n, generator=generator) * 0.1)
+    return net
+
+
+@pytest.fixture(scope="module")
+def net():
+    torch.manual_seed(0)
+    return _randomize_batchnorm(ARCHITECTURES["U2NETP"](3, 1)).eval()
+
+
+@pytest.fixture(scope="module")
+def x():
+    return torch.rand(2, 3, 64, 64, generator=torch.Generator().manual_seed(1))
+
+
+def _assert_close(expected, actual, atol=1e-5):
+    for e, a in zip(expected, actual):
+        # Guard against comparing saturated, constant maps
+        assert e.std() > 1e-3
+        torch.testing.assert_close(a, e, rtol=0, atol=atol)
+
+
+def test_rebnconv_fuse_matches_batchnorm():
+    block = _randomize_batchnorm(REBNCONV(8, 16, dirate=2)).eval()
+    x = torch.randn(2, 8, 24, 24, generator=torch.Generator().manual_seed(2))
+    with torch.no_grad():
+        expected = block(x)
+        fused = copy.deepcopy(block).fuse()
+        actual = fused(x)
+    assert isinstance(fused.bn_s1, torch.nn.Identity)
+    torch.testing.assert_close(actual, expected, rtol=0, atol=1e-5)
+
+
+def test_fuse_rebnconv_matches_every_output(net, x):
+    fused = fuse_rebnconv(copy.deepcopy(net))
+    assert not any(isinstance(module, torch.nn.BatchNorm2d) for module in fused.modules())
+    with torch.no_grad():
+        _assert_close(net(x), fused(x))
+
+
+@pytest.fixture(scope="module")
+def checkpoint(net, tmp_path_factory):
+    path = tmp_path_factory.mktemp("fusion") / "u2netp.pth"
+    torch.save(net.state_dict(), path)
+    return path
+
+
+def test_fused_pth_load_matches_unfused(checkpoint, x):
+    unfused = build_network(str(checkpoint), arch="U2NETP", device="cpu", output=None, fuse=False)
+    fused = build_network(str(checkpoint), arch="U2NETP", device="cpu", output=None, fuse=True)
+    with torch.no_grad():
+        _assert_close(unfused(x), fused(x))
+
+
+def test_fused_safetensors_load_matches_unfused(checkpoint, x, tmp_path):
+    path = convert(checkpoint, tmp_path / "u2netp.safetensors", arch="U2NETP", fuse=True)
+    unfused = build_network(str(checkpoint), arch="U2NETP", device="cpu", output=None, fuse=False)
+    mapped = build_network(str(path), arch="U2NETP", device="cpu", output=None)
+    assert not any(isinstance(module, torch.nn.BatchNorm2d) for module in mapped.modules())
+    with torch.no_grad():
+        _assert_close(unfused(x), mapped(x))
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+import image_ops
+from image_ops import fit_box, preprocess
+
+
+def _reference(image, size, box=None):
+    """preprocess as it was before the downscale moved ahead of the RGB conversion"""
+    rgb = image.convert('RGB')
+    if box is None:
+        pixels = np.asarray(rgb.resize((size, size), reducing_gap=3.0))
+    else:
+        left, top, right, bottom = box
+        pixels = np.asarray(rgb.resize((right - left, bottom - top), reducing_gap=3.0))
+        pixels = np.pad(pixels, ((top, size - bottom), (left, size - right), (0, 0)), mode='edge')
+    return torch.from_numpy(pixels.transpose((2, 0, 1)) * np.float32(1.0 / 255.0)).unsqueeze(0)
+
+
+def _image(mode):
+    rng = np.random.default_rng(0)
+    rgba = rng.integers(0, 256, (1201, 1603, 4), dtype=np.uint8)
+    # Smooth regions too, so the filters see more than noise
+    rgba[:600, :800, :3] = np.linspace(0, 255, 800, dtype=np.uint8)[None, :, None]
+    image = Image.fromarray(rgba, 'RGBA')
+    if mode == 'P':
+        return image.convert('RGB').quantize(64)
+    return image.convert(mode)
+
+
+@pytest.mark.parametrize("strip_pixels", [1 << 20, 50_000], ids=["default", "banded"])
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "P", "L"])
+@pytest.mark.parametrize("letterbox", [False, True], ids=["stretch", "letterbox"])
+def test_preprocess_matches_converting_first(monkeypatch, mode, letterbox, strip_pixels):
+    monkeypatch.setattr(image_ops, "_CONVERT_STRIP_PIXELS", strip_pixels)
+    image = _image(mode)
+    box = fit_box(image.size, 320) if letterbox else None
+    assert torch.equal(preprocess(image, size=320, box=box), _reference(image, 320, box))
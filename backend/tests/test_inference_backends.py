@@ -0,0 +1,41 @@
+import pytest
+import torch
+
+from export_model import check_parity, export_torchscript
+from inference_backends import EagerBackend, TorchScriptBackend
+from model_registry import ARCHITECTURES, build_network
+
+
+@pytest.fixture(scope="module")
+def net():
+    torch.manual_seed(0)
+    return ARCHITECTURES["U2NETP"](3, 1).eval()
+
+
+@pytest.fixture
+def batch():
+    return torch.rand(2, 3, 64, 64, generator=torch.Generator().manual_seed(0))
+
+
+def test_eager_backend_serves_fused_map(net, batch):
+    with torch.no_grad():
+        d0, d1, *_ = net.set_inference_output(None)(batch)
+    served = EagerBackend(net)(batch)
+    assert torch.equal(served, d0)
+    assert not torch.equal(served, d1)
+
+
+def test_torchscript_export_matches_unmodified_model(net, batch, tmp_path):
+    path = export_torchscript(net.set_inference_output("d0"), tmp_path / "u2netp_d0.pt", size=64)
+    reference = EagerBackend(net.set_inference_output(None))
+    result = check_parity(reference, TorchScriptBackend(path, "cpu"), [batch], tolerance=1e-4)
+    assert result["ok"], result
+
+
+def test_build_network_serves_fused_map_by_default(net, batch, tmp_path):
+    path = tmp_path / "u2netp.pth"
+    torch.save(net.state_dict(), path)
+    served = build_network(str(path), arch="U2NETP", device="cpu", fuse=False)
+    with torch.no_grad():
+        d0, *_ = net.set_inference_output(None)(batch)
+        assert torch.equal(served(batch), d0)
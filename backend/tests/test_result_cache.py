@@ -0,0 +1,113 @@
+import hashlib
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import result_cache
+from result_cache import LRUCache, MaskCache
+
+
+def test_lru_evicts_least_recently_used_within_byte_budget():
+    cache = LRUCache(10)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"
+    # 12 bytes would exceed the budget; "b" is now the least recently used
+    cache.put("c", b"cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"aaaa" and cache.get("c") == b"cccc"
+    # Replacing a value frees its old size
+    cache.put("a", b"a")
+    cache.put("d", b"ddddd")
+    assert cache.get("c") == b"cccc" and cache.get("d") == b"ddddd"
+    assert cache.stats()["bytes"] == 10
+
+
+def test_lru_counts_hits_misses_and_evictions():
+    cache = LRUCache(8)
+    assert cache.get("a") is None
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    cache.get("a")
+    cache.get("b")
+    cache.put("c", b"cccc")
+    # Larger than the whole budget: not stored, nothing evicted for it
+    cache.put("huge", b"x" * 9)
+    assert cache.get("huge") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (2, 2, 1)
+    assert (stats["entries"], stats["bytes"], stats["max_bytes"]) == (2, 8, 8)
+
+
+def test_mask_cache_disk_tier_round_trips_across_instances(tmp_path):
+    mask = np.arange(320 * 320, dtype=np.uint32).astype(np.uint8).reshape(320, 320)
+    MaskCache(1 << 20, disk_dir=tmp_path, disk_max_bytes=1 << 20).put("key", mask)
+
+    # A new process starts with an empty memory tier
+    cache = MaskCache(1 << 20, disk_dir=tmp_path, disk_max_bytes=1 << 20)
+    loaded = cache.get("key")
+    assert loaded.dtype == np.uint8 and np.array_equal(loaded, mask)
+    assert cache.stats()["disk"]["hits"] == 1
+    # Promoted to memory, so the next lookup does not touch the disk
+    assert cache.get("key") is loaded
+    assert cache.stats()["disk"]["hits"] == 1
+    assert cache.get("missing") is None
+
+
+def test_mask_cache_disk_tier_evicts_least_recently_used(tmp_path):
+    mask = np.zeros((320, 320), dtype=np.uint8)
+    entry_bytes = mask.nbytes + 128
+    cache = MaskCache(0, disk_dir=tmp_path, disk_max_bytes=3 * entry_bytes)
+    for age, key in enumerate(("read", "unread", "new"), start=1):
+        cache.put(key, mask)
+        # Spread the modification times; reads touch the file
+        os.utime(tmp_path / f"{key}.npy", (age, age))
+    cache.get("read")
+    cache.put("newest", mask)
+    assert sorted(path.stem for path in tmp_path.glob("*.npy")) == ["new", "newest", "read"]
+    assert cache.stats()["disk"]["evictions"] == 1
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L", "P"])
+def test_image_digest_hashes_strips_like_the_whole_image(monkeypatch, mode):
+    monkeypatch.setattr(result_cache, "DIGEST_STRIP_BYTES", 4096)
+    pixels = np.random.default_rng(0).integers(0, 256, (301, 97, 3), dtype=np.uint8)
+    image = Image.fromarray(pixels, "RGB").convert(mode)
+
+    expected = hashlib.blake2b(digest_size=16)
+    expected.update(f"key|{mode}|97x301|".encode())
+    expected.update(image.tobytes())
+    assert result_cache.image_digest(image, "key") == expected.hexdigest()
+
+
+@pytest.mark.parametrize("setting, value", [
+    ("INFERENCE_OUTPUT", "d1"),
+    ("INFERENCE_BACKEND", "mmap"),
+    ("FUSE_BATCHNORM", False),
+    ("INFERENCE_LETTERBOX", True),
+    ("INFERENCE_SIZE", "auto"),
+])
+def test_model_cache_key_covers_serving_settings(monkeypatch, tmp_path, setting, value):
+    import config
+    from background_removal import model_cache_key
+
+    model_path = tmp_path / "u2net.pth"
+    model_path.write_bytes(b"weights")
+    before = model_cache_key(model_path)
+    monkeypatch.setattr(config, setting, value)
+    assert model_cache_key(model_path) != before
+
+
+def test_model_cache_key_covers_replaced_weights(tmp_path):
+    import os
+
+    from background_removal import model_cache_key
+
+    model_path = tmp_path / "u2net.pth"
+    model_path.write_bytes(b"weights")
+    before = model_cache_key(model_path)
+    model_path.write_bytes(b"new weights")
+    os.utime(model_path, ns=(0, 0))
+    assert model_cache_key(model_path) != before
@@ -63,6 +63,7 @@ function App() {
       const formData = new FormData();
       formData.append("file", file);
       formData.append("resolution", exportOptions.resolution);
+      formData.append("format", exportOptions.format);
 
       const response = await fetch(`${API_BASE_URL}/api/remove-background`, {
         method: "POST",
@@ -97,7 +98,8 @@ function App() {
       const downloadUrl = `${API_BASE_URL}/api/download/${processedFilename}`;
       const link = document.createElement("a");
       link.href = downloadUrl;
-      link.download = `processed_image_${exportOptions.resolution}.png`;
+      const extension = processedFilename.split(".").pop();
+      link.download = `processed_image_${exportOptions.resolution}.${extension}`;
       document.body.appendChild(link);
       link.click();
       document.body.removeChild(link);